@@ -1,124 +1,137 @@
-''' Demonstrates how advanced orders can be created and submitted '''
-
-import time
-from threading import Thread
-
-from ibapi.client import EClient, Contract
-from ibapi.wrapper import EWrapper
-from ibapi.utils import iswrapper
-from ibapi.order import Order
-from ibapi.order_condition import OrderCondition, Create
-from ibapi.tag_value import TagValue
-
-class AdvOrder(EWrapper, EClient):
-    ''' Serves as the client and the wrapper '''
-
-    def __init__(self, addr, port, client_id):
-        EClient. __init__(self, self)
-
-        # Connect to TWS
-        self.connect(addr, port, client_id)
-        self.order_id = 0
-        self.con_id = 0
-        self.exch = ''
-
-        # Launch the client thread
-        thread = Thread(target=self.run)
-        thread.start()
-
-    @iswrapper
-    def contractDetails(self, reqId, details):
-        ''' Obtain details for the contract '''
-        self.con_id = details.contract.conId
-        self.exch = details.contract.exchange
-
-    @iswrapper
-    def nextValidId(self, order_id):
-        ''' Obtain an ID for the order '''
-        self.order_id = order_id
-
-    @iswrapper
-    def orderStatus(self, order_id, status, filled, remaining,
-        avgFillPrice, permId, parentId, lastFillPrice, clientId,
-        whyHeld, mktCapPrice):
-        ''' Check the status of the subnitted order '''
-
-        print('Order status: {}'.format(status))
-
-    @iswrapper
-    def error(self, req_id, code, msg):
-        print('Error {}: {}'.format(code, msg))
-
-def main():
-
-    # Create the client and connect to TWS
-    client = AdvOrder('127.0.0.1', 7497, 0)
-    time.sleep(0.5)
-
-    # Define the contract
-    con = Contract()
-    con.symbol = 'IBM'
-    con.secType = 'STK'
-    con.currency = 'USD'
-    con.exchange = 'SMART'
-
-    # Get unique ID for contract
-    client.reqContractDetails(0, con)
-    time.sleep(3)
-
-    # Create a volume condition
-    vol_condition = Create(OrderCondition.Volume)
-    vol_condition.conId = client.con_id
-    vol_condition.exchange = client.exch
-    vol_condition.isMore = True
-    vol_condition.volume = 20000
-
-    # Obtain an ID for the main order
-    client.reqIds(1000)
-    time.sleep(2)
-
-    # Create the bracket order
-    main_order = Order()
-    main_order.orderId = client.order_id
-    main_order.action = 'BUY'
-    main_order.orderType = 'MKT'
-    main_order.totalQuantity = 100
-    main_order.transmit = False
-    main_order.conditions.append(vol_condition)
-
-    # Set the algorithm for the order
-    main_order.algoStrategy = 'Adaptive'
-    main_order.algoParams = []
-    main_order.algoParams.append(TagValue('adaptivePriority', 'Patient'))
-
-    # First child order - limit order
-    first_child = Order()
-    first_child.orderId = client.order_id + 1
-    first_child.action = 'SELL'
-    first_child.orderType = 'LMT'
-    first_child.totalQuantity = 100
-    first_child.lmtPrice = 170
-    first_child.parentId = client.order_id
-    first_child.transmit = False
-
-    # Stop order child
-    second_child = Order()
-    second_child.orderId = client.order_id + 2
-    second_child.action = 'SELL'
-    second_child.orderType = 'STP'
-    second_child.totalQuantity = 100
-    second_child.auxPrice = 120
-    second_child.parentId = client.order_id
-    second_child.transmit = False
-
-    # Submit each order
-    client.placeOrder(client.order_id, con, main_order)
-    client.placeOrder(client.order_id+1, con, first_child)
-    client.placeOrder(client.order_id+2, con, second_child)
-
-     # Sleep while the request is processed
-    time.sleep(5)
-    client.disconnect()
-
-if __name__ == '__main__':
+''' Demonstrates how advanced orders can be created and submitted '''
+
+from concurrent.futures import wait
+from threading import Thread
+import os
+import sys
+
+from ibapi.client import EClient, Contract
+from ibapi.wrapper import EWrapper
+from ibapi.utils import iswrapper
+from ibapi.order import Order
+from ibapi.order_condition import OrderCondition, Create
+from ibapi.tag_value import TagValue
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.contract_cache import ContractCache, DetailsLookup
+from common.order_group import OrderGroups
+from common.order_ids import OrderIds
+from common.order_store import OrderStore
+from common.pending import RequestTracker
+
+class AdvOrder(RequestTracker, OrderIds, DetailsLookup, EWrapper, EClient):
+    ''' Serves as the client and the wrapper '''
+
+    def __init__(self, addr, port, client_id, cache=None):
+        EClient. __init__(self, self)
+
+        # Order IDs are reserved locally after TWS provides the first
+        OrderIds.__init__(self)
+
+        # Bracket and OCA groups submitted by the client, and their state
+        self.orders = OrderStore()
+        self.groups = OrderGroups(self, self.orders)
+
+        # Futures for pending requests, and the cache of contract details
+        RequestTracker.__init__(self)
+        DetailsLookup.__init__(self, cache)
+        self.connected = self.expect('nextValidId')
+
+        # Connect to TWS
+        self.connect(addr, port, client_id)
+
+        # Launch the client thread
+        thread = Thread(target=self.run)
+        thread.start()
+
+    @iswrapper
+    def orderStatus(self, order_id, status, filled, remaining,
+        avgFillPrice, permId, parentId, lastFillPrice, clientId,
+        whyHeld, mktCapPrice):
+        ''' Check the status of the subnitted order '''
+
+        print('Order status: {}'.format(status))
+        self.orders.on_order_status(order_id, status, filled, remaining,
+            avgFillPrice, permId, parentId)
+        self.groups.on_status(order_id, status)
+
+    @iswrapper
+    def openOrder(self, order_id, contract, order, state):
+        ''' Called when TWS accepts or updates an order '''
+        self.orders.on_open_order(order_id, contract, order, state)
+
+    @iswrapper
+    def execDetails(self, req_id, contract, execution):
+        ''' Called when an order is filled '''
+        self.orders.on_execution(contract, execution)
+
+def main():
+
+    # Create the client and connect to TWS
+    client = AdvOrder('127.0.0.1', 7497, 0, ContractCache())
+    wait([client.connected], timeout=5)
+
+    # Define the contract
+    con = Contract()
+    con.symbol = 'IBM'
+    con.secType = 'STK'
+    con.currency = 'USD'
+    con.exchange = 'SMART'
+
+    # Get unique ID for contract
+    details = client.get_details(0, con)
+    if not details:
+        print('Could not access contract data')
+        client.disconnect()
+        return
+
+    # Create a volume condition
+    vol_condition = Create(OrderCondition.Volume)
+    vol_condition.conId = details[0].contract.conId
+    vol_condition.exchange = details[0].contract.exchange
+    vol_condition.isMore = True
+    vol_condition.volume = 20000
+
+    # Create the bracket order
+    main_order = Order()
+    main_order.action = 'BUY'
+    main_order.orderType = 'MKT'
+    main_order.totalQuantity = 100
+    main_order.conditions.append(vol_condition)
+
+    # Set the algorithm for the order
+    main_order.algoStrategy = 'Adaptive'
+    main_order.algoParams = []
+    main_order.algoParams.append(TagValue('adaptivePriority', 'Patient'))
+
+    # First child order - limit order
+    first_child = Order()
+    first_child.action = 'SELL'
+    first_child.orderType = 'LMT'
+    first_child.totalQuantity = 100
+    first_child.lmtPrice = 170
+
+    # Stop order child
+    second_child = Order()
+    second_child.action = 'SELL'
+    second_child.orderType = 'STP'
+    second_child.totalQuantity = 100
+    second_child.auxPrice = 120
+
+    # Submit the orders together
+    bracket = client.groups.bracket(con, main_order, first_child,
+        second_child)
+
+    # Wait until the orders are acknowledged
+    bracket.wait(timeout=5)
+    for order_id, latency in bracket.latencies().items():
+        if latency is None:
+            print('Order {}: no acknowledgement'.format(order_id))
+        else:
+            print('Order {}: acknowledged in {:.2f} ms'.format(order_id,
+                1000 * latency))
+    client.disconnect()
+
+if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,261 @@
+''' Evaluates order conditions locally against streaming market data '''
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from itertools import count
+from threading import Lock
+import random
+import time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from ibapi.order_condition import OrderCondition, Create
+
+# Condition types that can be evaluated from market and account data
+SUPPORTED = {OrderCondition.Price, OrderCondition.Time, OrderCondition.Margin,
+    OrderCondition.Volume, OrderCondition.PercentChange}
+
+def parse_condition_time(text):
+    ''' Converts the time of a TimeCondition to seconds since the epoch.
+        A time without a time zone is local '''
+    stamp = datetime.strptime(text[:17], '%Y%m%d %H:%M:%S')
+    zone = text[17:].strip()
+    if zone:
+        try:
+            stamp = stamp.replace(tzinfo=ZoneInfo(zone))
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError('Unknown time zone in {}'.format(text))
+    return stamp.timestamp()
+
+def threshold(cond):
+    ''' Returns the value a condition compares against '''
+    if cond.condType == OrderCondition.Price:
+        return cond.price
+    if cond.condType == OrderCondition.Volume:
+        return cond.volume
+    if cond.condType == OrderCondition.PercentChange:
+        return cond.changePercent
+    if cond.condType == OrderCondition.Margin:
+        return cond.percent
+    return parse_condition_time(cond.time)
+
+class Atom:
+    ''' Holds the state of one condition of a group '''
+
+    def __init__(self, cond, group):
+        self.cond = cond
+        self.group = group
+        self.value = float(threshold(cond))
+        self.true = False
+        self.index = None
+        self.index_key = None
+
+class Group:
+    ''' Holds the conditions attached to one order '''
+
+    def __init__(self, key, conditions):
+        self.key = key
+        self.atoms = [Atom(cond, self) for cond in conditions]
+
+    def evaluate(self):
+        ''' Combines the conditions from left to right with AND or OR '''
+        result = self.atoms[0].true
+        for prev, atom in zip(self.atoms, self.atoms[1:]):
+            if prev.cond.isConjunctionConnection:
+                result = result and atom.true
+            else:
+                result = result or atom.true
+        return result
+
+class ThresholdIndex:
+    ''' Keeps the conditions on one value sorted by threshold '''
+
+    def __init__(self, is_more, value=None):
+        self.is_more = is_more
+        self.keys = []
+        self.atoms = []
+        self.value = value
+
+    def split(self, value):
+        ''' Returns the position between false and true conditions, which
+            hold at their thresholds like >= and <= in TWS '''
+        if self.is_more:
+            return bisect_right(self.keys, (value, float('inf')))
+        return bisect_left(self.keys, (value,))
+
+    def add(self, atom, seq):
+        key = (atom.value, seq)
+        pos = bisect_left(self.keys, key)
+        self.keys.insert(pos, key)
+        self.atoms.insert(pos, atom)
+        if self.value is not None:
+
+            # Conditions below the split hold for >=, the others for <=
+            split = self.split(self.value)
+            atom.true = pos < split if self.is_more else pos >= split
+        return key
+
+    def remove(self, key):
+        pos = bisect_left(self.keys, key)
+        del self.keys[pos]
+        del self.atoms[pos]
+
+    def update(self, value):
+        ''' Sets the value and returns the conditions whose state flipped '''
+        new = self.split(value)
+        old = self.split(self.value) if self.value is not None else (
+            0 if self.is_more else len(self.keys))
+        self.value = value
+        if new == old:
+            return []
+
+        # Only the conditions between the old and new positions change
+        lo, hi = min(old, new), max(old, new)
+        state = (new > old) == self.is_more
+        flipped = self.atoms[lo:hi]
+        for atom in flipped:
+            atom.true = state
+        return flipped
+
+class ConditionEngine:
+    ''' Triggers groups of conditions as market and account data arrive '''
+
+    def __init__(self, on_trigger=None):
+        self.lock = Lock()
+        self.seq = count()
+
+        # Called with the key and conditions of each group that triggers
+        self.on_trigger = on_trigger
+
+        # Indexes keyed by (condition type, contract ID, is_more), and the
+        # latest values keyed by (condition type, contract ID)
+        self.indexes = {}
+        self.values = {}
+        self.groups = {}
+        self.closes = {}
+
+    def index(self, cond_type, con_id, is_more):
+        key = (cond_type, con_id, bool(is_more))
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = ThresholdIndex(bool(is_more),
+                self.values.get((cond_type, con_id)))
+        return index
+
+    def add(self, key, conditions):
+        ''' Watches the conditions of an order, returns True if they already
+            hold '''
+        for cond in conditions:
+            if cond.condType not in SUPPORTED:
+                raise ValueError('Unsupported condition type {}'.format(
+                    cond.condType))
+        group = Group(key, conditions)
+        with self.lock:
+            self.groups[key] = group
+            for atom in group.atoms:
+                cond = atom.cond
+                index = self.index(cond.condType, getattr(cond, 'conId', None),
+                    cond.isMore)
+                atom.index_key = index.add(atom, next(self.seq))
+                atom.index = index
+            triggered = group.evaluate()
+            if triggered:
+                self.remove_group(group)
+        if triggered:
+            self.fire([group])
+        return triggered
+
+    def remove(self, key):
+        ''' Stops watching the conditions of an order '''
+        with self.lock:
+            group = self.groups.get(key)
+            if group is not None:
+                self.remove_group(group)
+
+    def remove_group(self, group):
+        del self.groups[group.key]
+        for atom in group.atoms:
+            atom.index.remove(atom.index_key)
+
+    def update(self, cond_type, con_id, value):
+        ''' Updates a value and returns the groups that triggered '''
+        triggered = []
+        with self.lock:
+            self.values[(cond_type, con_id)] = value
+            flipped = []
+            for is_more in (True, False):
+                index = self.indexes.get((cond_type, con_id, is_more))
+                if index is not None:
+                    flipped += index.update(value)
+
+            # Evaluate groups once both indexes hold the new value
+            for atom in flipped:
+                group = atom.group
+                if atom.true and self.groups.get(group.key) is group \
+                    and group.evaluate():
+                    triggered.append(group)
+                    self.remove_group(group)
+        if triggered:
+            self.fire(triggered)
+        return triggered
+
+    def fire(self, groups):
+        if self.on_trigger:
+            for group in groups:
+                self.on_trigger(group.key, [atom.cond for atom in group.atoms])
+
+    def on_price(self, con_id, price):
+        ''' Updates the price and percent change of a contract '''
+        triggered = self.update(OrderCondition.Price, con_id, price)
+        close = self.closes.get(con_id)
+        if close:
+            triggered += self.update(OrderCondition.PercentChange, con_id,
+                100.0 * (price / close - 1.0))
+        return triggered
+
+    def on_close(self, con_id, close):
+        ''' Sets the previous close that percent changes are measured from '''
+        self.closes[con_id] = close
+
+    def on_volume(self, con_id, volume):
+        return self.update(OrderCondition.Volume, con_id, volume)
+
+    def on_margin(self, cushion):
+        ''' Updates the margin cushion of the account in percent '''
+        return self.update(OrderCondition.Margin, None, cushion)
+
+    def on_time(self, now=None):
+        return self.update(OrderCondition.Time, None, now or time.time())
+
+def main():
+
+    # Create conditions on the price and volume of 100 contracts
+    engine = ConditionEngine()
+    rng = random.Random(1)
+    for key in range(5000):
+        price = Create(OrderCondition.Price)
+        price.conId = rng.randrange(100)
+        price.isMore = rng.random() < 0.5
+        price.price = 100.0 + rng.uniform(-10.0, 10.0)
+        volume = Create(OrderCondition.Volume)
+        volume.conId = price.conId
+        volume.isMore = True
+        volume.volume = rng.randrange(1000000)
+        engine.add(key, [price, volume])
+
+    # Replay random walks and time each tick
+    prices = [100.0] * 100
+    volumes = [0] * 100
+    num_ticks = 100000
+    num_triggered = 0
+    start = time.perf_counter()
+    for _ in range(num_ticks):
+        con_id = rng.randrange(100)
+        prices[con_id] += rng.gauss(0.0, 0.1)
+        volumes[con_id] += 100
+        num_triggered += len(engine.on_price(con_id, prices[con_id]))
+        num_triggered += len(engine.on_volume(con_id, volumes[con_id]))
+    elapsed = time.perf_counter() - start
+    print('{} conditions triggered over {} ticks, {:.1f} us per tick'.format(
+        num_triggered, num_ticks, 1e6 * elapsed / num_ticks))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+''' Compares the condition engine with evaluating every condition '''
+from datetime import datetime, timezone
+import random
+
+import pytest
+
+from ibapi.order_condition import OrderCondition, Create
+
+from condition_engine import ConditionEngine, parse_condition_time
+
+def holds(cond, values):
+    ''' Evaluates one condition the way TWS does, >= or <= '''
+    value = values.get((cond.condType, cond.conId))
+    if value is None:
+        return False
+    limit = cond.price if cond.condType == OrderCondition.Price \
+        else cond.volume
+    return value >= limit if cond.isMore else value <= limit
+
+def evaluate(conditions, values):
+    result = holds(conditions[0], values)
+    for prev, cond in zip(conditions, conditions[1:]):
+        if prev.isConjunctionConnection:
+            result = result and holds(cond, values)
+        else:
+            result = result or holds(cond, values)
+    return result
+
+def random_condition(rng):
+    cond = Create(rng.choice([OrderCondition.Price, OrderCondition.Volume]))
+    cond.conId = rng.randrange(3)
+    cond.isMore = rng.random() < 0.5
+    cond.isConjunctionConnection = rng.random() < 0.5
+
+    # Thresholds on a coarse grid, so values often land exactly on them
+    if cond.condType == OrderCondition.Price:
+        cond.price = float(rng.randrange(10))
+    else:
+        cond.volume = rng.randrange(10)
+    return cond
+
+@pytest.mark.parametrize('seed', range(20))
+def test_engine_matches_brute_force(seed):
+    rng = random.Random(seed)
+    engine = ConditionEngine()
+    values = {}
+    groups = {}
+    for step in range(300):
+
+        # Add an order now and then, it triggers at once if it holds
+        if rng.random() < 0.3:
+            key = step
+            conditions = [random_condition(rng)
+                for _ in range(rng.randint(1, 3))]
+            assert engine.add(key, conditions) == evaluate(conditions, values)
+            if not evaluate(conditions, values):
+                groups[key] = conditions
+            continue
+
+        # Move a value onto the grid and compare the triggered orders
+        cond_type = rng.choice([OrderCondition.Price, OrderCondition.Volume])
+        con_id = rng.randrange(3)
+        value = rng.randrange(10)
+        values[(cond_type, con_id)] = value
+        triggered = engine.update(cond_type, con_id, value)
+        expected = {key for key, conditions in groups.items()
+            if evaluate(conditions, values)}
+        assert {group.key for group in triggered} == expected
+        for key in expected:
+            del groups[key]
+
+def test_threshold_is_inclusive():
+    engine = ConditionEngine()
+    volume = Create(OrderCondition.Volume)
+    volume.conId = 1
+    volume.isMore = True
+    volume.volume = 1000
+    price = Create(OrderCondition.Price)
+    price.conId = 1
+    price.isMore = False
+    price.price = 50.0
+    engine.add('volume', [volume])
+    engine.add('price', [price])
+    assert [g.key for g in engine.on_volume(1, 999)] == []
+    assert [g.key for g in engine.on_volume(1, 1000)] == ['volume']
+    assert [g.key for g in engine.update(OrderCondition.Price, 1, 50.01)] \
+        == []
+    assert [g.key for g in engine.update(OrderCondition.Price, 1, 50.0)] \
+        == ['price']
+
+def test_condition_time_zone():
+    expected = datetime(2024, 1, 2, 15, 30, tzinfo=timezone.utc).timestamp()
+    assert parse_condition_time('20240102 15:30:00 UTC') == expected
+    assert parse_condition_time('20240102 10:30:00 US/Eastern') == expected
+    with pytest.raises(ValueError):
+        parse_condition_time('20240102 10:30:00 Nowhere/Special')
@@ -0,0 +1,295 @@
+''' Updates indicators for many symbols at once as each bar closes
+
+The classes hold the state of the indicators of common/indicators.py for
+every symbol in NumPy arrays, and compute their values with its array
+functions.
+Their update(bars, mask) takes a Bars tuple whose fields hold one element
+per symbol and a mask of the symbols that have a bar, and updates only
+those symbols. It returns an array of values, NaN for symbols without
+enough bars. Recursive and cumulative indicators match the streaming
+classes exactly, windowed ones to rounding error.
+'''
+from collections import namedtuple
+import os
+import sys
+import time
+
+import numpy as np
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import indicators
+
+# One bar for each symbol, each field an array
+Bars = namedtuple('Bars', 'open high low close volume')
+
+class History:
+    ''' Holds the last values of every symbol, oldest first, with time
+        along the first axis like the functions of indicators.py '''
+
+    def __init__(self, num_symbols, depth):
+        self.values = np.full((depth, num_symbols), np.nan)
+        self.count = np.zeros(num_symbols, dtype=int)
+
+    def push(self, x, mask):
+        ''' Appends the values of the symbols in mask '''
+        if mask.all():
+
+            # Shifting whole rows is much faster than selecting columns
+            self.values[:-1] = self.values[1:]
+            self.values[-1] = x
+        else:
+            self.values[:-1, mask] = self.values[1:, mask]
+            self.values[-1, mask] = x[mask]
+        self.count[mask] += 1
+
+    def full(self):
+        return self.count >= len(self.values)
+
+class Average:
+    ''' EMA of each symbol, seeded with the mean of its first period
+        values '''
+
+    def __init__(self, num_symbols, period, alpha):
+        self.period = period
+        self.alpha = alpha
+        self.history = History(num_symbols, period)
+        self.value = np.full(num_symbols, np.nan)
+
+    def add(self, x, mask):
+
+        # Only symbols without a value need their values kept
+        filling = mask & ~self.history.full()
+        step = mask & ~filling
+        if filling.any():
+            self.history.push(x, filling)
+
+            # Seed the symbols that just filled their window
+            seed = filling & self.history.full()
+            if seed.any():
+                self.value[seed] = indicators.recurse(
+                    self.history.values[:, seed], self.alpha,
+                    self.period)[-1]
+        if step.any():
+            self.value[step] = indicators.recurse(x[None, step], self.alpha,
+                self.period, init=self.value[step])[0]
+        return self.value
+
+    def ready(self):
+        return self.history.full()
+
+class SMA:
+    ''' Simple moving average of each symbol's last period values '''
+
+    def __init__(self, num_symbols, period, field='close'):
+        self.period = period
+        self.field = field
+        self.history = History(num_symbols, period)
+
+    def update(self, bars, mask):
+        self.history.push(getattr(bars, self.field), mask)
+        return np.where(self.history.full(), indicators.sma(
+            self.history.values, self.period)[-1], np.nan)
+
+class EMA:
+    ''' Exponential moving average seeded with the SMA of the first
+        period values '''
+
+    def __init__(self, num_symbols, period, field='close', alpha=None):
+        self.field = field
+        self.average = Average(num_symbols, period,
+            alpha if alpha is not None else 2.0 / (period + 1))
+
+    def update(self, bars, mask):
+        return self.average.add(getattr(bars, self.field), mask).copy()
+
+class SMMA(EMA):
+    ''' Wilder's smoothed moving average '''
+
+    def __init__(self, num_symbols, period, field='close'):
+        EMA.__init__(self, num_symbols, period, field, 1.0 / period)
+
+class RollingStd:
+    ''' Standard deviation of each symbol's last period values '''
+
+    def __init__(self, num_symbols, period, field='close', ddof=0):
+        self.period = period
+        self.field = field
+        self.ddof = ddof
+        self.history = History(num_symbols, period)
+
+    def update(self, bars, mask):
+        self.history.push(getattr(bars, self.field), mask)
+        return np.where(self.history.full(), indicators.rolling_std(
+            self.history.values, self.period, self.ddof)[-1], np.nan)
+
+class Bollinger:
+    ''' Returns (average, upper band, lower band) '''
+
+    def __init__(self, num_symbols, period=20, width=2.0, field='close'):
+        self.period = period
+        self.field = field
+        self.width = width
+        self.history = History(num_symbols, period)
+
+    def update(self, bars, mask):
+        self.history.push(getattr(bars, self.field), mask)
+        full = self.history.full()
+        return tuple(np.where(full, band[-1], np.nan)
+            for band in indicators.bollinger(self.history.values,
+                self.period, self.width))
+
+class ATR:
+    ''' Average true range, the Wilder average of the true range '''
+
+    def __init__(self, num_symbols, period=14):
+        self.close = History(num_symbols, 2)
+        self.average = Average(num_symbols, period, 1.0 / period)
+
+    def update(self, bars, mask):
+        self.close.push(bars.close, mask)
+        true_range = indicators.range_from(bars.high, bars.low,
+            self.close.values[0])
+        self.average.add(true_range, mask & self.close.full())
+        return self.average.value.copy()
+
+class RSI:
+    ''' Relative strength index from Wilder averages of gains and losses '''
+
+    def __init__(self, num_symbols, period=14, field='close'):
+        self.field = field
+        self.prices = History(num_symbols, 2)
+        self.gains = Average(num_symbols, period, 1.0 / period)
+        self.losses = Average(num_symbols, period, 1.0 / period)
+
+    def update(self, bars, mask):
+        self.prices.push(getattr(bars, self.field), mask)
+        change = self.prices.values[1] - self.prices.values[0]
+        mask = mask & self.prices.full()
+        gain = self.gains.add(np.maximum(change, 0.0), mask)
+        loss = self.losses.add(np.maximum(-change, 0.0), mask)
+        return indicators.rsi_from(gain, loss)
+
+class OBV:
+    ''' On-balance volume '''
+
+    def __init__(self, num_symbols):
+        self.close = History(num_symbols, 2)
+        self.value = np.zeros(num_symbols)
+
+    def update(self, bars, mask):
+        self.close.push(bars.close, mask)
+        flow = indicators.obv_flow(bars.close, self.close.values[0],
+            bars.volume)
+        moved = mask & self.close.full()
+        self.value[moved] += flow[moved]
+        return np.where(self.close.count > 0, self.value, np.nan)
+
+class AccDist:
+    ''' Accumulation/distribution line '''
+
+    def __init__(self, num_symbols):
+        self.value = np.zeros(num_symbols)
+
+    def update(self, bars, mask):
+        flow = indicators.clv_flow(bars.high, bars.low, bars.close,
+            bars.volume)
+        self.value[mask] += flow[mask]
+        return self.value.copy()
+
+class MACD:
+    ''' Returns (MACD, signal line, histogram) '''
+
+    def __init__(self, num_symbols, fast=12, slow=26, signal=9,
+        field='close'):
+        self.field = field
+        self.fast = Average(num_symbols, fast, 2.0 / (fast + 1))
+        self.slow = Average(num_symbols, slow, 2.0 / (slow + 1))
+        self.signal = Average(num_symbols, signal, 2.0 / (signal + 1))
+
+    def update(self, bars, mask):
+        x = getattr(bars, self.field)
+        line = self.fast.add(x, mask) - self.slow.add(x, mask)
+        signal = self.signal.add(line, mask & self.slow.ready())
+        line = np.where(self.signal.ready(), line, np.nan)
+        return line, signal.copy(), line - signal
+
+class TSI:
+    ''' True strength index '''
+
+    def __init__(self, num_symbols, slow=25, fast=13, field='close'):
+        self.field = field
+        self.prices = History(num_symbols, 2)
+        self.num_slow = Average(num_symbols, slow, 2.0 / (slow + 1))
+        self.num_fast = Average(num_symbols, fast, 2.0 / (fast + 1))
+        self.den_slow = Average(num_symbols, slow, 2.0 / (slow + 1))
+        self.den_fast = Average(num_symbols, fast, 2.0 / (fast + 1))
+
+    def update(self, bars, mask):
+        self.prices.push(getattr(bars, self.field), mask)
+        m = self.prices.values[1] - self.prices.values[0]
+        mask = mask & self.prices.full()
+        num = self.num_slow.add(m, mask)
+        den = self.den_slow.add(np.abs(m), mask)
+        mask = mask & self.num_slow.ready()
+        num = self.num_fast.add(num, mask)
+        den = self.den_fast.add(den, mask)
+        return indicators.tsi_from(num, den)
+
+class CrossSection:
+    ''' Updates a set of named indicators for a list of symbols '''
+
+    def __init__(self, symbols, **factories):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # Each factory takes the number of symbols and returns an indicator
+        self.indicators = {name: factory(len(self.symbols))
+            for name, factory in factories.items()}
+
+    def bars(self, bar_data):
+        ''' Builds a Bars tuple from a dict of BarData keyed by symbol, and
+            the mask of the symbols that have a bar '''
+        rows = np.full((5, len(self.symbols)), np.nan)
+        mask = np.zeros(len(self.symbols), dtype=bool)
+        for symbol, bar in bar_data.items():
+            i = self.index.get(symbol)
+            if i is not None:
+                rows[:, i] = (bar.open, bar.high, bar.low, bar.close,
+                    bar.volume)
+                mask[i] = True
+        return Bars(*rows), mask
+
+    def update(self, bars, mask=None):
+        ''' Updates every indicator for the symbols in mask, all symbols by
+            default, and returns their values by name '''
+        if mask is None:
+            mask = np.ones(len(self.symbols), dtype=bool)
+        return {name: indicator.update(bars, mask)
+            for name, indicator in self.indicators.items()}
+
+def main():
+
+    # Create random walks for 3000 symbols
+    num_symbols, num_bars = 3000, 500
+    rng = np.random.default_rng(0)
+    close = 100.0 + np.cumsum(rng.normal(0.0, 1.0, (num_bars, num_symbols)),
+        axis=0)
+    spread = rng.random((num_bars, num_symbols))
+    volume = rng.integers(100, 10000, (num_bars, num_symbols)).astype(float)
+
+    # Compute RSI, ATR, Bollinger bands and MACD at each bar close
+    engine = CrossSection(range(num_symbols),
+        rsi=lambda n: RSI(n, 14), atr=lambda n: ATR(n, 14),
+        bollinger=lambda n: Bollinger(n, 20), macd=lambda n: MACD(n))
+    start = time.perf_counter()
+    for t in range(num_bars):
+        values = engine.update(Bars(close[t], close[t] + spread[t],
+            close[t] - spread[t], close[t], volume[t]))
+    elapsed = time.perf_counter() - start
+    print('RSI of the first symbols: {}'.format(values['rsi'][:5]))
+    print('Updated {} symbols in {:.2f} ms per bar'.format(num_symbols,
+        1000 * elapsed / num_bars))
+
+if __name__ == '__main__':
+    main()
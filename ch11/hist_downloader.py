@@ -0,0 +1,337 @@
+''' Downloads historical bars in chunks and caches them on disk '''
+from collections import deque
+from concurrent.futures import wait
+from datetime import datetime
+from threading import Thread
+import math
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from ibapi.client import EClient
+from ibapi.common import BarData
+from ibapi.wrapper import EWrapper
+from ibapi.utils import iswrapper
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pending import RequestTracker, WARNING_CODES
+
+# Seconds per unit of a duration or bar size string
+DURATION_UNITS = {'S': 1, 'D': 86400, 'W': 7*86400, 'M': 30*86400,
+    'Y': 365*86400}
+BAR_UNITS = {'sec': 1, 'secs': 1, 'min': 60, 'mins': 60, 'hour': 3600,
+    'hours': 3600, 'day': 86400, 'days': 86400, 'week': 7*86400,
+    'month': 30*86400}
+
+# Longest period TWS returns in one request, keyed by bar size in seconds
+MAX_CHUNK = [(1, 1800), (5, 7200), (15, 14400), (30, 28800), (60, 86400),
+    (180, 7*86400), (900, 14*86400), (1800, 30*86400), (86400, 365*86400)]
+
+# Columns stored for each bar
+COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume', 'average',
+    'count']
+
+# Error codes that mean the connection to TWS was lost
+DISCONNECT_CODES = {502, 504, 1100, 2110}
+
+def parse_duration(duration):
+    ''' Returns the number of seconds in a duration string like '6 M' '''
+    num, unit = duration.split()
+    return int(num) * DURATION_UNITS[unit.upper()]
+
+def parse_bar_size(bar_size):
+    ''' Returns the number of seconds in a bar size string like '5 mins' '''
+    num, unit = bar_size.split()
+    return int(num) * BAR_UNITS[unit.lower()]
+
+def parse_bar_time(date):
+    ''' Converts the date of a bar to seconds since the epoch '''
+    if len(date) == 8:
+        return int(datetime.strptime(date, '%Y%m%d').timestamp())
+    if date.isdigit():
+        return int(date)
+    return int(datetime.strptime(re.sub(r'\s+', ' ', date),
+        '%Y%m%d %H:%M:%S').timestamp())
+
+def subtract(start, end, spans):
+    ''' Returns the parts of [start, end] not covered by sorted spans '''
+    missing = []
+    for span_start, span_end in spans:
+        if span_end <= start or span_start >= end:
+            continue
+        if span_start > start:
+            missing.append((start, span_start))
+        start = max(start, span_end)
+    if start < end:
+        missing.append((start, end))
+    return missing
+
+def merge(spans):
+    ''' Combines overlapping spans into a sorted list '''
+    merged = []
+    for span_start, span_end in sorted(spans):
+        if merged and span_start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], span_end))
+        else:
+            merged.append((span_start, span_end))
+    return merged
+
+class BarCache:
+    ''' Stores bars column by column in one .npz file per series '''
+
+    def __init__(self, directory='bars'):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, contract, bar_size, what, use_rth=1):
+        ''' Returns the file of a series, marking bars outside regular
+            trading hours with ALL '''
+        name = '_'.join(str(field) for field in (contract.symbol,
+            contract.secType, contract.exchange, contract.currency,
+            contract.lastTradeDateOrContractMonth, bar_size, what,
+            '' if use_rth else 'ALL') if field)
+        return os.path.join(self.directory,
+            re.sub(r'[^\w.-]', '_', name) + '.npz')
+
+    def load(self, contract, bar_size, what, use_rth=1):
+        ''' Returns a dict of column arrays and the covered time spans '''
+        path = self.path(contract, bar_size, what, use_rth)
+        if not os.path.exists(path):
+            return {col: np.zeros(0) for col in COLUMNS}, []
+        with np.load(path) as data:
+            columns = {col: data[col] for col in COLUMNS}
+            spans = [tuple(span) for span in data['spans'].tolist()]
+        return columns, spans
+
+    def add(self, contract, bar_size, what, use_rth, chunks):
+        ''' Merges a list of (rows, span) chunks into the file at once '''
+        columns, spans = self.load(contract, bar_size, what, use_rth)
+        new = [np.array(rows, dtype=float).reshape(-1, len(COLUMNS))
+            for rows, span in chunks]
+
+        # Newer rows replace older rows with the same time
+        merged = np.concatenate([np.column_stack(
+            [columns[col] for col in COLUMNS])] + new)
+        times, index = np.unique(merged[::-1, 0], return_index=True)
+        merged = merged[::-1][index]
+        spans = merge(spans + [span for rows, span in chunks])
+
+        # Write to a temporary file so an interrupted write loses nothing
+        path = self.path(contract, bar_size, what, use_rth)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, spans=np.array(spans, dtype=float).reshape(-1, 2),
+            **{col: merged[:, i] for i, col in enumerate(COLUMNS)})
+        os.replace(tmp_path, path)
+
+class HistoricalDownloader(RequestTracker, EWrapper, EClient):
+    ''' Requests historical bars that are missing from the cache '''
+
+    def __init__(self, addr, port, client_id, cache=None, max_in_flight=3,
+        max_requests=60, pacing_period=600.0):
+        EClient. __init__(self, self)
+        self.address = (addr, port, client_id)
+        self.cache = cache or BarCache()
+        self.max_in_flight = max_in_flight
+
+        # Times of recent requests, limited to max_requests per period
+        self.max_requests = max_requests
+        self.pacing_period = pacing_period
+        self.sent = deque()
+        self.next_id = 0
+
+        # Rows, error codes and futures, keyed by request ID
+        RequestTracker.__init__(self)
+        self.rows = {}
+        self.errors = {}
+
+        # Connect to TWS
+        self.connected = self.expect('nextValidId')
+        self.open_connection()
+
+    def open_connection(self):
+        ''' Connects to TWS and launches the client thread '''
+        self.connect(*self.address)
+        thread = Thread(target=self.run)
+        thread.start()
+
+    @iswrapper
+    def nextValidId(self, order_id):
+        ''' Called once the connection to TWS is ready '''
+        self.resolve('nextValidId', order_id)
+
+    @iswrapper
+    def historicalData(self, reqId, bar):
+        ''' Called in response to reqHistoricalData, ignoring requests
+            that were given up '''
+        if reqId in self.pending:
+            self.rows.setdefault(reqId, []).append((parse_bar_time(
+                bar.date), bar.open, bar.high, bar.low, bar.close,
+                bar.volume, bar.average, bar.barCount))
+
+    @iswrapper
+    def historicalDataEnd(self, reqId, start, end):
+        ''' Called after historical data has been received '''
+        self.resolve(reqId, self.rows.pop(reqId, []))
+
+    @iswrapper
+    def error(self, reqId, code, msg):
+        ''' Records the error of a request before ending it '''
+        if reqId in self.pending and code not in WARNING_CODES:
+            self.errors[reqId] = (code, msg)
+        RequestTracker.error(self, reqId, code, msg)
+
+    @iswrapper
+    def connectionClosed(self):
+        ''' Fails every request still waiting for data '''
+        for req_id in list(self.pending):
+            self.errors[req_id] = (504, 'Not connected')
+            self.resolve(req_id)
+
+    def plan(self, start, end, bar_size, spans):
+        ''' Splits the uncovered parts of [start, end] into chunks '''
+        step = parse_bar_size(bar_size)
+        max_chunk = next((chunk for size, chunk in reversed(MAX_CHUNK)
+            if step >= size), MAX_CHUNK[0][1])
+        chunks = []
+        for gap_start, gap_end in subtract(start, end, spans):
+            chunk_end = gap_end
+            while chunk_end > gap_start:
+                chunks.append((max(chunk_end - max_chunk, gap_start),
+                    chunk_end))
+                chunk_end -= max_chunk
+        return chunks
+
+    def send_chunk(self, contract, bar_size, what, use_rth, chunk):
+        ''' Requests one chunk, waiting if the pacing limit was reached '''
+        now = time.time()
+        while self.sent and now - self.sent[0] > self.pacing_period:
+            self.sent.popleft()
+        if len(self.sent) >= self.max_requests:
+            time.sleep(self.pacing_period - (now - self.sent[0]))
+            self.sent.popleft()
+        self.sent.append(time.time())
+
+        # Express the duration in seconds, or in whole days for long bars
+        chunk_start, chunk_end = chunk
+        seconds = int(math.ceil(chunk_end - chunk_start))
+        if seconds > 86400 or parse_bar_size(bar_size) >= 86400:
+            duration = '{} D'.format(max(1, math.ceil(seconds/86400)))
+        else:
+            duration = '{} S'.format(max(1, seconds))
+        end_str = datetime.fromtimestamp(chunk_end).strftime(
+            '%Y%m%d %H:%M:%S')
+
+        self.next_id += 1
+        req_id = self.next_id
+        future = self.expect(req_id)
+        self.reqHistoricalData(req_id, contract, end_str, duration, bar_size,
+            what, use_rth, 2, False, [])
+        return req_id, future
+
+    def download(self, contract, start, end, bar_size, what, use_rth=1,
+        timeout=30.0, max_retries=3):
+        ''' Downloads the missing chunks of [start, end] into the cache '''
+        columns, spans = self.cache.load(contract, bar_size, what, use_rth)
+        chunks = deque(self.plan(start, end, bar_size, spans))
+        received = []
+        try:
+            return self.fetch(contract, bar_size, what, use_rth, chunks,
+                received, timeout, max_retries)
+        finally:
+
+            # Write the chunks that arrived in one update of the file
+            if received:
+                self.cache.add(contract, bar_size, what, use_rth, received)
+
+    def fetch(self, contract, bar_size, what, use_rth, chunks, received,
+        timeout, max_retries):
+        ''' Requests chunks and appends (rows, span) pairs to received '''
+        retries = {}
+        in_flight = {}
+        try:
+            while chunks or in_flight:
+
+                # Reconnect and resend if the connection was lost
+                if not self.isConnected():
+                    self.connected = self.expect('nextValidId')
+                    self.open_connection()
+                    if not wait([self.connected], timeout=5).done:
+                        print('Could not reconnect to TWS')
+                        return False
+
+                # Keep up to max_in_flight chunks outstanding
+                while chunks and len(in_flight) < self.max_in_flight:
+                    chunk = chunks.popleft()
+                    req_id, future = self.send_chunk(contract, bar_size, what,
+                        use_rth, chunk)
+                    in_flight[future] = (req_id, chunk)
+
+                # Collect each chunk as soon as it arrives
+                done, _ = wait(list(in_flight), timeout=timeout,
+                    return_when='FIRST_COMPLETED')
+                if not done:
+                    print('Historical data request timed out')
+                    return False
+                for future in done:
+                    req_id, chunk = in_flight.pop(future)
+                    code, msg = self.errors.pop(req_id, (None, ''))
+                    if future.result() is not None:
+                        received.append((future.result(), chunk))
+                    elif code == 162 and 'no data' in msg.lower():
+                        received.append(([], chunk))
+                    elif retries.get(chunk, 0) < max_retries:
+                        retries[chunk] = retries.get(chunk, 0) + 1
+                        if code not in DISCONNECT_CODES:
+                            time.sleep(2 ** retries[chunk])
+                        chunks.append(chunk)
+                    else:
+                        print('Giving up on chunk ending {}'.format(
+                            datetime.fromtimestamp(chunk[1])))
+                        return False
+            return True
+        finally:
+
+            # Cancel the chunks still in flight when giving up, so their
+            # futures and rows do not stay behind
+            for req_id, chunk in in_flight.values():
+                if self.isConnected():
+                    self.cancelHistoricalData(req_id)
+                self.pending.pop(req_id, None)
+                self.rows.pop(req_id, None)
+                self.errors.pop(req_id, None)
+
+    def get_columns(self, contract, duration, bar_size, what, end=None,
+        use_rth=1):
+        ''' Returns a dict of column arrays, requesting only uncached bars '''
+        end = end or time.time()
+        start = end - parse_duration(duration)
+        if not self.download(contract, start, end, bar_size, what, use_rth):
+            raise RuntimeError('Could not download {} bars of {}'.format(
+                bar_size, contract.symbol))
+
+        # Read the requested period from the cache
+        columns, spans = self.cache.load(contract, bar_size, what, use_rth)
+        keep = (columns['time'] >= start) & (columns['time'] <= end)
+        return {col: columns[col][keep] for col in COLUMNS}
+
+    def get_bars(self, contract, duration, bar_size, what, end=None,
+        use_rth=1):
+        ''' Returns a list of BarData, requesting only uncached bars '''
+        columns = self.get_columns(contract, duration, bar_size, what, end,
+            use_rth)
+        daily = parse_bar_size(bar_size) >= 86400
+        bars = []
+        for row in zip(*[columns[col].tolist() for col in COLUMNS]):
+            bar = BarData()
+            bar.date = datetime.fromtimestamp(row[0]).strftime('%Y%m%d') \
+                if daily else str(int(row[0]))
+            bar.open, bar.high, bar.low, bar.close = row[1:5]
+            bar.volume = int(row[5])
+            bar.average = row[6]
+            bar.barCount = int(row[7])
+            bars.append(bar)
+        return bars
@@ -0,0 +1,103 @@
+''' Shares market data lines and rotates them under the account's limit '''
+from collections import OrderedDict
+from itertools import count
+from threading import Lock
+
+class Line:
+    ''' Describes one reqMktData subscription '''
+
+    def __init__(self, req_id, contract, generic_ticks):
+        self.req_id = req_id
+        self.contract = contract
+        self.generic_ticks = generic_ticks
+        self.refs = 0
+
+def line_key(contract, generic_ticks):
+    ''' Identifies subscriptions that can share a line '''
+    return (contract.conId, contract.symbol, contract.secType,
+        contract.exchange, contract.currency,
+        contract.lastTradeDateOrContractMonth, contract.strike,
+        contract.right, generic_ticks)
+
+class LineManager:
+    ''' Opens, shares and evicts reqMktData lines for a client '''
+
+    def __init__(self, client, max_lines=100, first_id=1000, on_evict=None):
+        self.client = client
+        self.max_lines = max_lines
+        self.req_ids = count(first_id)
+        self.lock = Lock()
+
+        # Called with the request ID of a line closed while still in use
+        self.on_evict = on_evict
+
+        # Lines in use and idle lines, least recently used first
+        self.active = OrderedDict()
+        self.idle = OrderedDict()
+        self.lines = {}
+
+    def subscribe(self, contract, generic_ticks=''):
+        ''' Returns the request ID of a line for the contract '''
+        key = line_key(contract, generic_ticks)
+        evicted = None
+        with self.lock:
+
+            # Share an open line
+            line = self.active.pop(key, None) or self.idle.pop(key, None)
+            if line is None:
+
+                # Make room by closing the least recently used line
+                if len(self.active) + len(self.idle) >= self.max_lines:
+                    if self.idle:
+                        self.close(*self.idle.popitem(last=False))
+                    else:
+                        old_key, evicted = self.active.popitem(last=False)
+                        self.close(old_key, evicted)
+
+                # Open a new line
+                line = Line(next(self.req_ids), contract, generic_ticks)
+                self.lines[line.req_id] = key
+                self.client.reqMktData(line.req_id, contract, generic_ticks,
+                    False, False, [])
+            line.refs += 1
+            self.active[key] = line
+
+        # Tell the consumer of an evicted line outside the lock
+        if evicted is not None and self.on_evict:
+            self.on_evict(evicted.req_id)
+        return line.req_id
+
+    def release(self, req_id):
+        ''' Marks a line as unused, keeping it open until room is needed '''
+        with self.lock:
+            key = self.lines.get(req_id)
+            line = self.active.get(key)
+            if line is None:
+                return
+            line.refs -= 1
+            if line.refs == 0:
+                del self.active[key]
+                self.idle[key] = line
+
+    def contract(self, req_id):
+        ''' Returns the contract of an open line or None '''
+        with self.lock:
+            key = self.lines.get(req_id)
+            line = self.active.get(key) or self.idle.get(key)
+            return line.contract if line else None
+
+    def close_all(self):
+        ''' Cancels every open line '''
+        with self.lock:
+            for lines in (self.active, self.idle):
+                while lines:
+                    self.close(*lines.popitem())
+
+    def close(self, key, line):
+        ''' Cancels a line that was removed from the active or idle lines '''
+        del self.lines[line.req_id]
+        if self.client.isConnected():
+            self.client.cancelMktData(line.req_id)
+
+    def __len__(self):
+        return len(self.active) + len(self.idle)
@@ -0,0 +1,372 @@
+''' Evaluates named indicators as a graph that shares common steps
+
+Strategies request outputs such as 'ATR(20)', '%b(5)' or
+'MAX(PREV(close), 20)'. Each request is broken into nodes like the true
+range, a moving average or a rolling standard deviation, and a node
+requested twice is only created and updated once. Indicators that take
+a series use the close when none is given, so 'SMA(20)' is the same
+node as 'SMA(close, 20)'.
+
+Nodes that average, sum or track a window add their inputs to the
+streaming indicators of common/indicators.py, and the RSI and TSI use its
+formulas. The ATR, RSI, MACD and TSI match the ch11 examples exactly. The
+Bollinger bands take their average from the SMA rather than the rolling
+standard deviation, and match to rounding error.
+'''
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import indicators
+
+class Node:
+    ''' Computes one value per bar from its inputs '''
+
+    def __init__(self, key, inputs, params):
+        self.key = key
+        self.inputs = inputs
+        self.params = params
+        self.value = None
+
+    def update(self, fields):
+        ''' Reads the values of the inputs, which are updated first '''
+        values = [node.value for node in self.inputs]
+        if None not in values:
+            self.value = self.compute(*values)
+
+class Field(Node):
+    ''' Reads a field of the bar, such as close or volume '''
+
+    def update(self, fields):
+        self.value = fields[self.params[0]]
+
+class Indicator(Node):
+    ''' Adds the values of its inputs to a streaming indicator, created
+        from the node's parameters '''
+
+    def __init__(self, key, inputs, params):
+        Node.__init__(self, key, inputs, params)
+        self.indicator = self.factory(*params)
+
+    def compute(self, *values):
+        return self.indicator.add(*values)
+
+class TR(Indicator):
+    ''' True range of the bar '''
+    factory = indicators.TrueRange
+
+class Typical(Node):
+    ''' Average of the high, low and close '''
+
+    def compute(self, high, low, close):
+        return (high + low + close) / 3.0
+
+class Prev(Node):
+    ''' Value of the input at the previous bar '''
+
+    def __init__(self, key, inputs, params):
+        Node.__init__(self, key, inputs, params)
+        self.last = None
+
+    def compute(self, x):
+        value, self.last = self.last, x
+        return value
+
+class Diff(Node):
+    ''' Change of the input since the previous bar '''
+
+    def __init__(self, key, inputs, params):
+        Node.__init__(self, key, inputs, params)
+        self.last = None
+
+    def compute(self, x):
+        value = x - self.last if self.last is not None else None
+        self.last = x
+        return value
+
+class Abs(Node):
+    def compute(self, x):
+        return abs(x)
+
+class Pos(Node):
+    def compute(self, x):
+        return max(x, 0.0)
+
+class Neg(Node):
+    def compute(self, x):
+        return max(-x, 0.0)
+
+class Sub(Node):
+    def compute(self, x, y):
+        return x - y
+
+class Sum(Indicator):
+    factory = indicators.RollingSum
+
+class SMA(Indicator):
+    factory = indicators.SMA
+
+class EMA(Indicator):
+    factory = indicators.EMA
+
+class SMMA(Indicator):
+    factory = indicators.SMMA
+
+class STD(Indicator):
+    ''' Population standard deviation of the last period values '''
+    factory = indicators.RollingStd
+
+class Max(Indicator):
+    factory = indicators.RollingMax
+
+class Min(Indicator):
+    factory = indicators.RollingMin
+
+class Skip(Node):
+    ''' Drops the first values of the input, so the nodes reading it start
+        later '''
+
+    def __init__(self, key, inputs, params):
+        Node.__init__(self, key, inputs, params)
+        self.count = 0
+
+    def compute(self, x):
+        self.count += 1
+        return x if self.count > self.params[0] else None
+
+class PercentB(Node):
+    ''' Position of the input between the Bollinger bands, in percent '''
+
+    def compute(self, x, avg, sigma):
+        width = self.params[0]
+        if sigma == 0.0:
+            return 50.0
+        return 100.0 * (x - (avg - width * sigma)) / (2 * width * sigma)
+
+class Bands(Node):
+    ''' Returns (average, upper band, lower band) '''
+
+    def compute(self, avg, sigma):
+        width = self.params[0]
+        return (avg, avg + width * sigma, avg - width * sigma)
+
+class MoneyFlow(Node):
+    ''' Typical price times volume, negative when the typical price fell '''
+
+    def __init__(self, key, inputs, params):
+        Node.__init__(self, key, inputs, params)
+        self.last = None
+
+    def compute(self, typical, volume):
+        sign = -1.0 if self.last is not None and typical < self.last else 1.0
+        self.last = typical
+        return sign * typical * volume
+
+class Ratio(Node):
+    ''' 100 * pos / (pos + neg), as in the MFI '''
+
+    def compute(self, pos, neg):
+        total = pos + neg
+        return 100.0 * pos / total if total else 100.0
+
+class MACDLines(Node):
+    ''' Returns (MACD, signal line, histogram) '''
+
+    def compute(self, line, signal):
+        return (line, signal, line - signal)
+
+class RSIRatio(Node):
+    def compute(self, gain, loss):
+        return indicators.rsi_value(gain, loss)
+
+class TSIRatio(Node):
+    def compute(self, num, den):
+        return indicators.tsi_value(num, den)
+
+class Graph:
+    ''' Builds shared nodes for requested indicators and updates them '''
+
+    def __init__(self):
+
+        # Nodes keyed by their canonical names, in the order to update them
+        self.nodes = {}
+        self.outputs = {}
+
+    def node(self, cls, inputs=(), params=()):
+        ''' Returns the node with these inputs and parameters, creating it
+            only if it does not exist '''
+
+        # Numbers like 2.0 and 2 give the same node
+        params = tuple(int(p) if isinstance(p, float) and p.is_integer()
+            else p for p in params)
+        key = '{}({})'.format(cls.__name__.upper(), ','.join(
+            [node.key for node in inputs] + [str(p) for p in params]))
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = cls(key, list(inputs), params)
+        return node
+
+    def field(self, name):
+        return self.node(Field, (), (name,))
+
+    def add(self, spec):
+        ''' Requests an indicator such as 'ATR(20)' and returns its node '''
+        node = self.outputs.get(spec)
+        if node is None:
+            node = self.outputs[spec] = self.build(parse(spec))
+        return node
+
+    def build(self, expr):
+        ''' Creates the nodes of a parsed expression '''
+        if isinstance(expr, (int, float)):
+            return expr
+        if isinstance(expr, str):
+            if expr in BUILDERS:
+                return BUILDERS[expr](self)
+            return self.field(expr)
+        name, args = expr
+        args = [self.build(arg) for arg in args]
+
+        # Use the close if no series is given
+        if not args or not isinstance(args[0], Node):
+            if name in SERIES_ARGS:
+                args.insert(0, self.field('close'))
+        return BUILDERS[name](self, *args)
+
+    def update(self, **fields):
+        ''' Updates every node once with a bar's fields and returns the
+            requested values '''
+        for node in self.nodes.values():
+            node.update(fields)
+        return {spec: node.value for spec, node in self.outputs.items()}
+
+    def __len__(self):
+        return len(self.nodes)
+
+def tr(graph):
+    return graph.node(TR, [graph.field('high'), graph.field('low'),
+        graph.field('close')])
+
+def typical(graph):
+    return graph.node(Typical, [graph.field('high'), graph.field('low'),
+        graph.field('close')])
+
+def rsi(graph, src, period=14):
+    change = graph.node(Diff, [src])
+    gain = graph.node(SMMA, [graph.node(Pos, [change])], [period])
+    loss = graph.node(SMMA, [graph.node(Neg, [change])], [period])
+    return graph.node(RSIRatio, [gain, loss])
+
+def mfi(graph, period=14):
+    flow = graph.node(MoneyFlow, [typical(graph), graph.field('volume')])
+    return graph.node(Ratio, [graph.node(Sum, [graph.node(Pos, [flow])],
+        [period]), graph.node(Sum, [graph.node(Neg, [flow])], [period])])
+
+def macd(graph, src, fast=12, slow=26, signal=9):
+    line = graph.node(Sub, [graph.node(EMA, [src], [fast]),
+        graph.node(EMA, [src], [slow])])
+    return graph.node(MACDLines, [line, graph.node(EMA, [line], [signal])])
+
+def tsi(graph, src, slow=25, fast=13):
+    change = graph.node(Diff, [src])
+    num = graph.node(EMA, [graph.node(EMA, [change], [slow])], [fast])
+    den = graph.node(EMA, [graph.node(EMA, [graph.node(Abs, [change])],
+        [slow])], [fast])
+    return graph.node(TSIRatio, [num, den])
+
+def series(cls):
+    ''' Returns a builder for a node of one series and one period '''
+    return lambda graph, src, period: graph.node(cls, [src], [period])
+
+# Builders keyed by the names used in requests
+BUILDERS = {
+    'TR': tr,
+    'TYPICAL': typical,
+    'PREV': lambda graph, src: graph.node(Prev, [src]),
+    'DIFF': lambda graph, src: graph.node(Diff, [src]),
+    'SKIP': lambda graph, src, count: graph.node(Skip, [src], [count]),
+    'SMA': series(SMA),
+    'EMA': series(EMA),
+    'SMMA': series(SMMA),
+    'STD': series(STD),
+    'SUM': series(Sum),
+    'MAX': series(Max),
+    'MIN': series(Min),
+    'ATR': lambda graph, period=14: graph.node(SMMA, [tr(graph)], [period]),
+    'BB': lambda graph, src, period=20, width=2: graph.node(Bands,
+        [graph.node(SMA, [src], [period]), graph.node(STD, [src], [period])],
+        [width]),
+    '%b': lambda graph, src, period=20, width=2: graph.node(PercentB,
+        [src, graph.node(SMA, [src], [period]),
+        graph.node(STD, [src], [period])], [width]),
+    'RSI': rsi,
+    'MFI': mfi,
+    'MACD': macd,
+    'TSI': tsi}
+
+# Indicators whose first argument is a series
+SERIES_ARGS = {'PREV', 'DIFF', 'SKIP', 'SMA', 'EMA', 'SMMA', 'STD', 'SUM',
+    'MAX', 'MIN', 'BB', '%b', 'RSI', 'MACD', 'TSI'}
+
+def parse(spec):
+    ''' Parses 'NAME(arg, ...)' into a name or a (name, args) pair '''
+    tokens = re.findall(r'[A-Za-z_%]+|[-\d.]+|[(),]', spec)
+    expr, pos = parse_expr(tokens, 0)
+    if pos != len(tokens):
+        raise ValueError('Unexpected text in {}'.format(spec))
+    return expr
+
+def parse_expr(tokens, pos):
+    token = tokens[pos]
+    pos += 1
+    if re.match(r'[-\d.]', token):
+        return (float(token) if '.' in token else int(token)), pos
+    if pos == len(tokens) or tokens[pos] != '(':
+        return token, pos
+    args = []
+    pos += 1
+    while tokens[pos] != ')':
+        arg, pos = parse_expr(tokens, pos)
+        args.append(arg)
+        if tokens[pos] == ',':
+            pos += 1
+    return (token, args), pos + 1
+
+def main():
+
+    # Indicators of the ch13 strategies and the ch11 examples
+    specs = ['ATR(20)', 'MAX(PREV(close), 20)', 'MIN(PREV(close), 20)',
+        'MAX(PREV(close), 10)', 'MIN(PREV(close), 10)', '%b(5)', 'MFI(10)',
+        'ATR(14)', 'BB(20)', 'RSI(14)', 'MACD(12, 26, 9)', 'TSI(25, 13)',
+        'SMA(100)']
+
+    # Compare one shared graph with a graph for each indicator
+    graph = Graph()
+    for spec in specs:
+        graph.add(spec)
+    separate = 0
+    for spec in specs:
+        single = Graph()
+        single.add(spec)
+        separate += len(single)
+    print('Nodes: {} shared, {} separate'.format(len(graph), separate))
+
+    # Update the graph with random bars
+    rng = np.random.default_rng(0)
+    close = 100.0 + np.cumsum(rng.normal(0.0, 1.0, 10000))
+    start = time.perf_counter()
+    for price in close.tolist():
+        values = graph.update(high=price + 0.5, low=price - 0.5, close=price,
+            volume=1000.0)
+    elapsed = time.perf_counter() - start
+    for spec, value in values.items():
+        print('{}: {}'.format(spec, value))
+    print('{:.1f} us per bar'.format(1e6 * elapsed / len(close)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+''' Demonstrates how an asyncio application can drive many requests at once '''
+import asyncio
+from contextlib import aclosing
+from itertools import count
+from threading import Thread
+import os
+import sys
+
+from ibapi.client import EClient, Contract
+from ibapi.wrapper import EWrapper
+from ibapi.utils import iswrapper
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pending import WARNING_CODES
+
+class AsyncClient(EWrapper, EClient):
+    ''' Serves as the client and the wrapper for an asyncio event loop '''
+
+    def __init__(self):
+        EClient. __init__(self, self)
+
+        # Results are delivered to the loop that created the client
+        self.loop = asyncio.get_running_loop()
+        self.ready = self.loop.create_future()
+        self.req_ids = count(1)
+
+        # Pending requests and open streams, keyed by request ID
+        self.rows = {}
+        self.futures = {}
+        self.streams = {}
+
+    @classmethod
+    async def create(cls, addr, port, client_id):
+        ''' Connects a new client to TWS without blocking the event loop '''
+        client = cls()
+        await client.loop.run_in_executor(None, client.connect, addr, port,
+            client_id)
+
+        # Launch the client thread
+        thread = Thread(target=client.run)
+        thread.start()
+        return client
+
+    # Callbacks, invoked on the client thread
+
+    @iswrapper
+    def nextValidId(self, order_id):
+        ''' Called once the connection to TWS is ready '''
+        self.loop.call_soon_threadsafe(self._finish_ready, order_id)
+
+    @iswrapper
+    def contractDetails(self, reqId, details):
+        ''' Called in response to reqContractDetails '''
+        self.loop.call_soon_threadsafe(self._add_row, reqId, details)
+
+    @iswrapper
+    def contractDetailsEnd(self, reqId):
+        ''' Called after the contract details have been received '''
+        self.loop.call_soon_threadsafe(self._finish, reqId)
+
+    @iswrapper
+    def historicalData(self, reqId, bar):
+        ''' Called in response to reqHistoricalData '''
+        self.loop.call_soon_threadsafe(self._add_row, reqId, bar)
+
+    @iswrapper
+    def historicalDataEnd(self, reqId, start, end):
+        ''' Called after historical data has been received '''
+        self.loop.call_soon_threadsafe(self._finish, reqId)
+
+    @iswrapper
+    def tickPrice(self, reqId, field, price, attribs):
+        ''' Called in response to reqMktData '''
+        self.loop.call_soon_threadsafe(self._push, reqId, (field, price))
+
+    @iswrapper
+    def tickByTickMidPoint(self, reqId, tick_time, midpoint):
+        ''' Called in response to reqTickByTickData '''
+        self.loop.call_soon_threadsafe(self._push, reqId,
+            (tick_time, midpoint))
+
+    @iswrapper
+    def realtimeBar(self, reqId, time, open, high, low, close, volume,
+        WAP, count):
+        ''' Called in response to reqRealTimeBars '''
+        self.loop.call_soon_threadsafe(self._push, reqId,
+            (time, open, high, low, close, volume, WAP, count))
+
+    @iswrapper
+    def error(self, reqId, code, msg):
+        ''' Called if an error occurs '''
+        if reqId == -1 or code in WARNING_CODES:
+            print('Error {}: {}'.format(code, msg))
+            return
+        exc = RuntimeError('Error {}: {}'.format(code, msg))
+        self.loop.call_soon_threadsafe(self._fail, reqId, exc)
+
+    @iswrapper
+    def connectionClosed(self):
+        ''' Called when the connection to TWS ends '''
+        exc = ConnectionError('Connection to TWS closed')
+        try:
+            self.loop.call_soon_threadsafe(self._fail_all, exc)
+        except RuntimeError:
+
+            # The event loop has already finished
+            pass
+
+    # Delivery, invoked on the event loop
+
+    def _finish_ready(self, order_id):
+        if not self.ready.done():
+            self.ready.set_result(order_id)
+
+    def _add_row(self, req_id, row):
+        rows = self.rows.get(req_id)
+        if rows is not None:
+            rows.append(row)
+
+    def _finish(self, req_id):
+        future = self.futures.pop(req_id, None)
+        rows = self.rows.pop(req_id, [])
+        if future is not None and not future.done():
+            future.set_result(rows)
+
+    def _push(self, req_id, item):
+        queue = self.streams.get(req_id)
+        if queue is not None:
+            queue.put_nowait(item)
+
+    def _fail(self, req_id, exc):
+        if req_id in self.futures:
+            self.rows.pop(req_id, None)
+            future = self.futures.pop(req_id)
+            if not future.done():
+                future.set_exception(exc)
+        elif req_id in self.streams:
+            self.streams[req_id].put_nowait(exc)
+        else:
+            print(exc)
+
+    def _fail_all(self, exc):
+        ''' Fails every pending request and ends every stream '''
+        if not self.ready.done():
+            self.ready.set_exception(exc)
+        for req_id in list(self.futures):
+            self._fail(req_id, exc)
+        for queue in self.streams.values():
+            queue.put_nowait(exc)
+
+    # Coroutines and async iterators
+
+    async def _request(self, send, cancel=None):
+        ''' Sends a request and returns its rows, forgetting the request
+            and cancelling it in TWS if the caller stops waiting '''
+        req_id = next(self.req_ids)
+        self.rows[req_id] = []
+        future = self.futures[req_id] = self.loop.create_future()
+        try:
+            send(req_id)
+            return await future
+        except asyncio.CancelledError:
+            if cancel is not None and self.isConnected():
+                cancel(req_id)
+            raise
+        finally:
+            self.futures.pop(req_id, None)
+            self.rows.pop(req_id, None)
+
+    async def contract_details(self, contract):
+        ''' Returns the list of ContractDetails matching the contract '''
+        return await self._request(
+            lambda req_id: self.reqContractDetails(req_id, contract))
+
+    async def historical_data(self, contract, end='', duration='1 M',
+        bar_size='1 day', what='MIDPOINT', use_rth=1):
+        ''' Returns the list of bars for the given period '''
+        return await self._request(
+            lambda req_id: self.reqHistoricalData(req_id, contract, end,
+                duration, bar_size, what, use_rth, 1, False, []),
+            self.cancelHistoricalData)
+
+    async def _stream(self, send, cancel):
+        ''' Subscribes when first iterated and yields the items of the
+            stream until the consumer stops '''
+        req_id = next(self.req_ids)
+        queue = self.streams[req_id] = asyncio.Queue()
+        try:
+            send(req_id)
+            while True:
+                item = await queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            del self.streams[req_id]
+            if self.isConnected():
+                cancel(req_id)
+
+    def tick_prices(self, contract, generic_ticks=''):
+        ''' Yields (field, price) pairs from reqMktData '''
+        return self._stream(lambda req_id: self.reqMktData(req_id, contract,
+            generic_ticks, False, False, []), self.cancelMktData)
+
+    def midpoints(self, contract):
+        ''' Yields (time, midpoint) pairs from reqTickByTickData '''
+        return self._stream(lambda req_id: self.reqTickByTickData(req_id,
+            contract, 'MidPoint', 0, True), self.cancelTickByTickData)
+
+    def realtime_bars(self, contract, what='MIDPOINT'):
+        ''' Yields five-second bars from reqRealTimeBars '''
+        return self._stream(lambda req_id: self.reqRealTimeBars(req_id,
+            contract, 5, what, True, []), self.cancelRealTimeBars)
+
+def stock(symbol):
+    ''' Creates a contract for a US stock '''
+    con = Contract()
+    con.symbol = symbol
+    con.secType = 'STK'
+    con.exchange = 'SMART'
+    con.currency = 'USD'
+    return con
+
+async def run():
+
+    # Create the client and wait for the connection
+    client = await AsyncClient.create('127.0.0.1', 7497, 0)
+    await asyncio.wait_for(client.ready, 5)
+
+    # Request details and history for several stocks concurrently
+    symbols = ['IBM', 'AAPL', 'MSFT', 'GE']
+    details, bars = await asyncio.gather(
+        asyncio.gather(*[client.contract_details(stock(s)) for s in symbols]),
+        asyncio.gather(*[client.historical_data(stock(s)) for s in symbols]))
+    for symbol, rows, hist in zip(symbols, details, bars):
+        print('{}: conId {}, {} bars'.format(symbol,
+            rows[0].contract.conId, len(hist)))
+
+    # Read ten midpoints for IBM
+    num_ticks = 0
+    async with aclosing(client.midpoints(stock('IBM'))) as ticks:
+        async for tick_time, midpoint in ticks:
+            print('Midpoint: {}'.format(midpoint))
+            num_ticks += 1
+            if num_ticks == 10:
+                break
+
+    # Disconnect from TWS
+    client.disconnect()
+
+def main():
+    asyncio.run(run())
+
+if __name__ == '__main__':
+    main()
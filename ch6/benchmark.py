@@ -0,0 +1,127 @@
+''' Measures callback throughput and request latency against tws_server '''
+from concurrent.futures import wait
+from threading import Thread
+import argparse
+import time
+import os
+import sys
+
+from ibapi.client import EClient, Contract
+from ibapi.wrapper import EWrapper
+from ibapi.utils import iswrapper
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pending import RequestTracker
+
+from dispatcher import Dispatcher
+from instrument import instrument
+from tws_server import TWSServer
+
+class BenchClient(RequestTracker, EWrapper, EClient):
+    ''' Counts callbacks and times request round trips '''
+
+    def __init__(self, addr, port, client_id):
+        EClient. __init__(self, self)
+
+        # Futures for pending requests, keyed by request ID
+        RequestTracker.__init__(self)
+        self.connected = self.expect('nextValidId')
+        self.ticks = {}
+
+        # Connect to TWS
+        self.connect(addr, port, client_id)
+
+        # Launch the client thread
+        thread = Thread(target=self.run)
+        thread.start()
+
+    @iswrapper
+    def nextValidId(self, order_id):
+        self.resolve('nextValidId', order_id)
+
+    @iswrapper
+    def tickByTickMidPoint(self, reqId, tick_time, midpoint):
+        self.ticks[reqId] = self.ticks.get(reqId, 0) + 1
+
+    @iswrapper
+    def historicalDataEnd(self, reqId, start, end):
+        self.resolve(reqId, time.perf_counter())
+
+def main():
+
+    # Read the benchmark settings
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=7597)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--streams', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--workers', type=int, default=0,
+        help='run callbacks on this many worker threads')
+    parser.add_argument('--instrument', metavar='CSV',
+        help='time each callback and write the results to a file')
+    args = parser.parse_args()
+
+    # Start the server with ticks sent as fast as possible
+    server = TWSServer('127.0.0.1', args.port, tick_rate=0)
+    Thread(target=server.serve_forever, daemon=True).start()
+    time.sleep(0.2)
+
+    # Create the client and connect to the server
+    client = BenchClient('127.0.0.1', args.port, 0)
+    wait([client.connected], timeout=5)
+    stats = instrument(client) if args.instrument else None
+    dispatcher = Dispatcher(client, args.workers) if args.workers else None
+    con = Contract()
+    con.symbol = 'IBM'
+    con.secType = 'STK'
+    con.exchange = 'SMART'
+    con.currency = 'USD'
+
+    # Time historical data requests one at a time
+    latencies = []
+    for req_id in range(args.requests):
+        done = client.expect(req_id)
+        start = time.perf_counter()
+        client.reqHistoricalData(req_id, con, '', '6 M', '1 day',
+            'MIDPOINT', 1, 2, False, [])
+        wait([done], timeout=5)
+
+        # Requests that failed or timed out have no finish time
+        finished = done.result() if done.done() else None
+        if finished is None:
+            print('Historical data request {} failed'.format(req_id))
+            continue
+        latencies.append(finished - start)
+    latencies.sort()
+    if latencies:
+        print('Historical data latency: p50 {:.3f} ms, p99 {:.3f} ms'.format(
+            1000 * latencies[len(latencies)//2],
+            1000 * latencies[int(len(latencies) * 0.99)]))
+
+    # Count tick callbacks over the streaming period
+    for req_id in range(args.streams):
+        client.reqTickByTickData(1000 + req_id, con, 'MidPoint', 0, True)
+    start = time.perf_counter()
+    time.sleep(args.seconds)
+    elapsed = time.perf_counter() - start
+    print('Tick callbacks: {:.0f} per second'.format(
+        sum(client.ticks.values())/elapsed))
+
+    # Print the busiest callbacks and write every row to the file
+    if stats:
+        totals = {}
+        for row in stats.summary():
+            totals[row['callback']] = totals.get(row['callback'], 0) + \
+                row['count']
+        for name, count in sorted(totals.items(), key=lambda t: -t[1])[:5]:
+            print('{}: {} calls'.format(name, count))
+        stats.dump(args.instrument)
+
+    # Disconnect from the server
+    client.disconnect()
+    if dispatcher:
+        dispatcher.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+''' Runs EWrapper callbacks on worker threads instead of the reader thread '''
+from contextvars import copy_context
+from queue import Empty, Queue
+from threading import Thread
+
+from instrument import callbacks
+
+class Dispatcher:
+    ''' Queues decoded callbacks and drains them in batches on workers '''
+
+    def __init__(self, client, num_workers=4, max_queued=10000,
+        batch_size=256, names=None):
+        self.client = client
+        self.batch_size = batch_size
+
+        # Exceptions raised by callbacks, handed to the caller by check
+        self.errors = Queue()
+
+        # Callbacks for one request ID always go to the same worker, so
+        # they run in the order they were decoded
+        self.queues = [Queue(max_queued) for _ in range(num_workers)]
+        self.workers = [Thread(target=self.drain, args=(queue,), daemon=True)
+            for queue in self.queues]
+        for worker in self.workers:
+            worker.start()
+
+        # Replace the client's callbacks with functions that queue them,
+        # keeping any wrapper installed before, such as Instrumentation
+        self.saved = {}
+        for name, keyed in callbacks(names):
+            self.saved[name] = client.__dict__.get(name)
+            setattr(client, name, self.deferred(getattr(client, name), keyed))
+
+    def deferred(self, method, keyed):
+        ''' Returns a function that queues calls to a callback '''
+        queues = self.queues
+        def enqueue(*args):
+
+            # Callbacks without a request ID keep their order on worker 0,
+            # and each carries the context of the message it came from
+            req_id = args[0] if keyed and args else 0
+            queues[hash(req_id) % len(queues)].put((copy_context(), method,
+                args))
+        return enqueue
+
+    def drain(self, queue):
+        ''' Runs queued callbacks, taking up to batch_size at a time '''
+        while True:
+            batch = [queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            for item in batch:
+                if item is None:
+                    return
+                context, method, args = item
+                try:
+                    context.run(method, *args)
+                except Exception as exc:
+                    self.errors.put(exc)
+
+    def backlog(self):
+        ''' Returns the number of callbacks waiting in each queue '''
+        return [queue.qsize() for queue in self.queues]
+
+    def check(self):
+        ''' Raises the oldest exception a callback raised and has not been
+            checked, while the workers keep running the other callbacks '''
+        try:
+            exc = self.errors.get_nowait()
+        except Empty:
+            return
+        raise exc
+
+    def stop(self):
+        ''' Runs the callbacks already queued, restores the client and
+            raises the oldest unchecked exception of a callback '''
+        for queue in self.queues:
+            queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        for name, previous in self.saved.items():
+            if previous is None:
+                delattr(self.client, name)
+            else:
+                setattr(self.client, name, previous)
+        self.check()
@@ -0,0 +1,171 @@
+''' Measures how often and how long each EWrapper callback runs '''
+from contextvars import ContextVar
+from threading import Lock
+import csv
+import inspect
+import time
+
+from ibapi.wrapper import EWrapper
+
+# Names of the first parameter of callbacks that identify a request
+REQ_ID_PARAMS = {'reqId', 'tickerId', 'orderId'}
+
+# Time the decoder started reading the message that led to a callback.
+# A context variable follows the message when a Dispatcher runs the
+# callback on another thread.
+decode_start = ContextVar('decode_start', default=0)
+
+def callbacks(names=None):
+    ''' Returns (name, keyed) pairs for EWrapper callbacks, where keyed
+        callbacks take a request or order ID as their first argument '''
+    if names is None:
+        names = [name for name, _ in inspect.getmembers(EWrapper,
+            inspect.isfunction) if not name.startswith('_') and
+            name != 'logAnswer']
+    pairs = []
+    for name in names:
+        params = list(inspect.signature(getattr(EWrapper, name))
+            .parameters)[1:]
+        pairs.append((name, bool(params) and params[0] in REQ_ID_PARAMS))
+    return pairs
+
+class Histogram:
+    ''' Counts values in log-linear buckets with bounded relative error '''
+
+    def __init__(self, sub_bits=5):
+
+        # Each power of two is split into 2**sub_bits buckets
+        self.sub_bits = sub_bits
+        self.counts = []
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def index(self, value):
+        shift = max(value.bit_length() - self.sub_bits - 1, 0)
+        return (shift << self.sub_bits) + (value >> shift)
+
+    def lowest(self, index):
+        ''' Returns the smallest value counted in a bucket '''
+        shift = max((index >> self.sub_bits) - 1, 0)
+        return (index - (shift << self.sub_bits)) << shift
+
+    def record(self, value):
+        ''' Counts a non-negative integer value '''
+        i = self.index(value)
+        if i >= len(self.counts):
+            self.counts.extend([0] * (i + 1 - len(self.counts)))
+        self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        ''' Returns the bucket value at or below which pct percent fall '''
+        target = max(1, pct * self.total / 100.0)
+        seen = 0
+        for i, num in enumerate(self.counts):
+            seen += num
+            if seen >= target:
+                return self.lowest(i)
+        return 0
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0.0
+
+class CallbackStats:
+    ''' Holds the histograms of one callback and request ID '''
+
+    def __init__(self):
+        self.count = 0
+        self.handler = Histogram()
+        self.latency = Histogram()
+
+class Instrumentation:
+    ''' Wraps the callbacks of a client to record their timing '''
+
+    def __init__(self, client, names=None):
+        self.client = client
+        self.lock = Lock()
+        self.stats = {}
+        self.started = time.perf_counter()
+
+        # Wrap every callback, or the named ones
+        self.saved = {}
+        for name, keyed in callbacks(names):
+            self.saved[name] = client.__dict__.get(name)
+            setattr(client, name, self.wrap(name, getattr(client, name),
+                keyed))
+
+        # Note when the decoder starts reading each message
+        self.interpret = client.decoder.interpret
+        client.decoder.interpret = self.timed_interpret
+
+    def timed_interpret(self, fields):
+        token = decode_start.set(time.perf_counter_ns())
+        try:
+            self.interpret(fields)
+        finally:
+            decode_start.reset(token)
+
+    def wrap(self, name, method, keyed):
+        ''' Returns a function that times calls to a callback '''
+        def timed(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                end = time.perf_counter_ns()
+                received = decode_start.get()
+                key = (name, args[0] if keyed and args else None)
+                with self.lock:
+                    stats = self.stats.get(key)
+                    if stats is None:
+                        stats = self.stats[key] = CallbackStats()
+                    stats.count += 1
+                    stats.handler.record(end - start)
+                    if received:
+                        stats.latency.record(max(end - received, 0))
+        return timed
+
+    def remove(self):
+        ''' Restores the original callbacks '''
+        for name, previous in self.saved.items():
+            if previous is None:
+                delattr(self.client, name)
+            else:
+                setattr(self.client, name, previous)
+        self.client.decoder.interpret = self.interpret
+
+    def summary(self):
+        ''' Returns one row of counts and microsecond timings per key '''
+        elapsed = time.perf_counter() - self.started
+        rows = []
+        with self.lock:
+            for (name, req_id), stats in sorted(self.stats.items(),
+                key=lambda item: (item[0][0], str(item[0][1]))):
+                rows.append({'callback': name, 'req_id': req_id,
+                    'count': stats.count,
+                    'per_sec': round(stats.count / elapsed, 1),
+                    'handler_p50_us': stats.handler.percentile(50) / 1000,
+                    'handler_p99_us': stats.handler.percentile(99) / 1000,
+                    'handler_max_us': stats.handler.max / 1000,
+                    'latency_p50_us': stats.latency.percentile(50) / 1000,
+                    'latency_p99_us': stats.latency.percentile(99) / 1000,
+                    'latency_max_us': stats.latency.max / 1000})
+        return rows
+
+    def dump(self, path):
+        ''' Writes the summary to a CSV file '''
+        rows = self.summary()
+        if not rows:
+            return
+        with open(path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+def instrument(client, names=None):
+    ''' Starts recording the callbacks of a connected client '''
+    return Instrumentation(client, names)
@@ -0,0 +1,678 @@
+''' Serves synthetic market data over the TWS API protocol for offline testing '''
+from datetime import datetime, timedelta
+from threading import Thread, Lock, Event
+import argparse
+import math
+import os
+import random
+import re
+import socket
+import time
+import zlib
+
+from ibapi import comm
+from ibapi.common import UNSET_DOUBLE
+from ibapi.contract import Contract
+from ibapi.message import IN, OUT
+
+# Highest protocol version spoken by the server
+SERVER_VERSION = 151
+MIN_CLIENT_VERSION = 137
+
+# Symbols returned by scans and symbol searches
+UNIVERSE = ['AAPL', 'ABBV', 'AMD', 'AMZN', 'BA', 'BAC', 'C', 'CAT', 'CSCO',
+    'CVX', 'DIS', 'F', 'GE', 'GM', 'GOOG', 'GS', 'HD', 'IBM', 'INTC', 'JNJ',
+    'JPM', 'KO', 'MA', 'MCD', 'META', 'MRK', 'MS', 'MSFT', 'NFLX', 'NKE',
+    'NVDA', 'ORCL', 'PEP', 'PFE', 'PG', 'QCOM', 'SBUX', 'SPY', 'T', 'TSLA',
+    'UNH', 'V', 'VXX', 'VZ', 'WFC', 'WMT', 'XOM']
+
+# Seconds per unit of a duration or bar size string
+DURATION_UNITS = {'S': 1, 'D': 86400, 'W': 7*86400, 'M': 30*86400,
+    'Y': 365*86400}
+BAR_UNITS = {'sec': 1, 'secs': 1, 'min': 60, 'mins': 60, 'hour': 3600,
+    'hours': 3600, 'day': 86400, 'days': 86400, 'week': 7*86400,
+    'month': 30*86400}
+
+# Tick types sent for reqMktData
+BID, ASK, LAST = 1, 2, 4
+
+def base_price(symbol):
+    ''' Returns a stable starting price for a symbol '''
+    return 20.0 + zlib.crc32(symbol.encode()) % 300
+
+def con_id(contract):
+    ''' Returns a stable contract ID for a contract '''
+    key = '{}:{}:{}:{}:{}'.format(contract.symbol, contract.secType,
+        contract.lastTradeDateOrContractMonth, contract.strike, contract.right)
+    return zlib.crc32(key.encode()) & 0x7fffffff
+
+def parse_float(value):
+    ''' Reads a float field that may be sent empty '''
+    return float(value) if value else UNSET_DOUBLE
+
+def parse_end(end_str):
+    ''' Reads the endDateTime of a historical data request '''
+    digits = re.findall(r'\d+', end_str)
+    if not digits:
+        return datetime.now()
+    day = datetime.strptime(digits[0], '%Y%m%d')
+    if len(digits) >= 4:
+        day = day.replace(hour=int(digits[1]), minute=int(digits[2]),
+            second=int(digits[3]))
+    return day
+
+def parse_duration(duration_str):
+    ''' Returns the number of seconds in a duration string like '6 M' '''
+    num, unit = duration_str.split()
+    return int(num) * DURATION_UNITS[unit.upper()]
+
+def parse_bar_size(bar_size):
+    ''' Returns the number of seconds in a bar size string like '5 mins' '''
+    num, unit = bar_size.split()
+    return int(num) * BAR_UNITS[unit.lower()]
+
+class Feed:
+    ''' Generates a random walk of prices for one instrument '''
+
+    def __init__(self, price, volatility=0.001):
+        self.price = price
+        self.volatility = volatility
+        self.rng = random.Random(price)
+
+    def next(self):
+        self.price *= math.exp(self.rng.gauss(0.0, self.volatility))
+        return round(self.price, 2)
+
+class Session(Thread):
+    ''' Serves the requests of one client connection '''
+
+    def __init__(self, server, sock, addr):
+        Thread.__init__(self, daemon=True)
+        self.server = server
+        self.sock = sock
+        self.addr = addr
+        self.version = SERVER_VERSION
+        self.send_lock = Lock()
+        self.stopped = Event()
+
+        # Client ID, next order ID, positions and streaming subscriptions
+        self.client_id = 0
+        self.next_order_id = 1
+        self.positions = {}
+        self.feeds = {}
+        self.streams = {}
+        self.stream_lock = Lock()
+
+        # Statistics reported when the client disconnects
+        self.requests = {}
+        self.msgs_sent = 0
+        self.bytes_sent = 0
+
+        # Dispatch table from outgoing message IDs to handlers
+        self.handlers = {
+            OUT.START_API: self.start_api,
+            OUT.REQ_CURRENT_TIME: self.current_time,
+            OUT.REQ_IDS: self.next_valid_id,
+            OUT.REQ_CONTRACT_DATA: self.contract_details,
+            OUT.REQ_MATCHING_SYMBOLS: self.matching_symbols,
+            OUT.REQ_HISTORICAL_DATA: self.historical_data,
+            OUT.REQ_MKT_DATA: self.mkt_data,
+            OUT.REQ_TICK_BY_TICK_DATA: self.tick_by_tick,
+            OUT.REQ_REAL_TIME_BARS: self.realtime_bars,
+            OUT.REQ_SEC_DEF_OPT_PARAMS: self.sec_def_opt_params,
+            OUT.REQ_SCANNER_SUBSCRIPTION: self.scanner,
+            OUT.REQ_FUNDAMENTAL_DATA: self.fundamental_data,
+            OUT.PLACE_ORDER: self.place_order,
+            OUT.REQ_POSITIONS: self.positions_data,
+            OUT.REQ_ACCOUNT_SUMMARY: self.account_summary,
+            OUT.REQ_ACCT_DATA: self.account_updates,
+            OUT.CANCEL_MKT_DATA: self.cancel_stream,
+            OUT.CANCEL_TICK_BY_TICK_DATA: self.cancel_tick_by_tick,
+            OUT.CANCEL_REAL_TIME_BARS: self.cancel_stream,
+            OUT.CANCEL_HISTORICAL_DATA: self.ignore,
+            OUT.CANCEL_SCANNER_SUBSCRIPTION: self.ignore,
+            OUT.CANCEL_ACCOUNT_SUMMARY: self.ignore,
+            OUT.CANCEL_POSITIONS: self.ignore,
+        }
+
+    def send(self, *fields):
+        ''' Encodes the fields and writes the message to the socket '''
+        msg = comm.make_msg(''.join(comm.make_field(f) for f in fields))
+        with self.send_lock:
+            self.sock.sendall(msg)
+            self.msgs_sent += 1
+            self.bytes_sent += len(msg)
+
+    def feed(self, symbol):
+        ''' Returns the price feed for a symbol '''
+        if symbol not in self.feeds:
+            self.feeds[symbol] = Feed(base_price(symbol))
+        return self.feeds[symbol]
+
+    def run(self):
+        start = time.time()
+        buf = b''
+        try:
+
+            # Perform the handshake
+            buf = self.recv_handshake()
+            if buf is None:
+                return
+
+            # Read and dispatch each request
+            while not self.stopped.is_set():
+                size, msg, buf = comm.read_msg(buf)
+                if msg:
+                    fields = [f.decode() for f in comm.read_fields(msg)]
+                    self.dispatch(fields)
+                    continue
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                buf += data
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.stopped.set()
+            self.sock.close()
+            self.report(time.time() - start)
+
+    def recv_handshake(self):
+        ''' Reads the API prefix and version range, then replies '''
+        buf = b''
+        while len(buf) < 4 or comm.read_msg(buf[4:])[1] == '':
+            data = self.sock.recv(4096)
+            if not data:
+                return None
+            buf += data
+        if buf[:4] != b'API\0':
+            return None
+        _, msg, rest = comm.read_msg(buf[4:])
+        versions = re.findall(r'\d+', msg.decode())
+        self.version = min(int(versions[1]), SERVER_VERSION)
+        if self.version < MIN_CLIENT_VERSION:
+            print('Client version {} is not supported'.format(self.version))
+            return None
+        conn_time = datetime.now().strftime('%Y%m%d %H:%M:%S EST')
+        self.send(self.version, conn_time)
+        return rest
+
+    def dispatch(self, fields):
+        msg_id = int(fields[0])
+        self.requests[msg_id] = self.requests.get(msg_id, 0) + 1
+        handler = self.handlers.get(msg_id)
+        if handler is None:
+            print('Unsupported request {} from {}'.format(msg_id, self.addr))
+            return
+        handler(iter(fields[1:]))
+
+    def report(self, elapsed):
+        ''' Prints statistics for the session '''
+        num_requests = sum(self.requests.values())
+        print('{}: {} requests, {} messages, {} bytes in {:.3f} s '
+            '({:.0f} msg/s)'.format(self.addr, num_requests, self.msgs_sent,
+            self.bytes_sent, elapsed, self.msgs_sent/max(elapsed, 1e-9)))
+
+    def read_contract(self, fields, with_con_id=True):
+        ''' Reads the contract fields common to most requests '''
+        con = Contract()
+        if with_con_id:
+            con.conId = int(next(fields) or 0)
+        con.symbol = next(fields)
+        con.secType = next(fields)
+        con.lastTradeDateOrContractMonth = next(fields)
+        con.strike = float(next(fields) or 0.0)
+        con.right = next(fields)
+        con.multiplier = next(fields)
+        con.exchange = next(fields)
+        con.primaryExchange = next(fields)
+        con.currency = next(fields)
+        con.localSymbol = next(fields)
+        con.tradingClass = next(fields)
+        return con
+
+    def start_api(self, fields):
+        next(fields)
+        self.client_id = int(next(fields))
+        self.send(IN.NEXT_VALID_ID, 1, self.next_order_id)
+        self.send(IN.MANAGED_ACCTS, 1, self.server.account)
+
+    def current_time(self, fields):
+        self.send(IN.CURRENT_TIME, 1, int(time.time()))
+
+    def next_valid_id(self, fields):
+        self.send(IN.NEXT_VALID_ID, 1, self.next_order_id)
+
+    def contract_details(self, fields):
+        next(fields)
+        req_id = int(next(fields))
+        con = self.read_contract(fields)
+        if not con.symbol and not con.conId:
+            self.send(IN.ERR_MSG, 2, req_id, 200,
+                'No security definition has been found for the request')
+            return
+
+        # Futures roll to the front month, options get a default expiry
+        if con.secType in ('FUT', 'CONTFUT') and \
+                not con.lastTradeDateOrContractMonth:
+            front = datetime.now() + timedelta(days=30)
+            con.lastTradeDateOrContractMonth = front.strftime('%Y%m')
+            con.localSymbol = '{}{}{}'.format(con.symbol,
+                'FGHJKMNQUVXZ'[front.month - 1], front.year % 10)
+        multiplier = con.multiplier or {'OPT': '100', 'FUT': '50',
+            'CONTFUT': '50'}.get(con.secType, '')
+        local_symbol = con.localSymbol or con.symbol
+        exchange = con.exchange or 'SMART'
+        self.send(IN.CONTRACT_DATA, 8, req_id, con.symbol, con.secType,
+            con.lastTradeDateOrContractMonth, con.strike, con.right,
+            exchange, con.currency or 'USD', local_symbol, con.symbol,
+            con.tradingClass or con.symbol, con.conId or con_id(con), 0.01,
+            1, multiplier, 'LMT,MKT,STP', 'SMART,NYSE,NASDAQ', 1, 0,
+            '{} Synthetic Corp'.format(con.symbol), 'NYSE', '',
+            'Technology', 'Computers', 'Computer Services', 'US/Eastern',
+            '', '', '', 0, 0, 1, '', '', '', '')
+        self.send(IN.CONTRACT_DATA_END, 1, req_id)
+
+    def matching_symbols(self, fields):
+        req_id = int(next(fields))
+        pattern = next(fields).upper()
+        matches = [s for s in UNIVERSE if s.startswith(pattern)]
+        if not matches:
+            matches = [re.sub(r'[^A-Z]', '', pattern)[:4] or 'X']
+        flds = [IN.SYMBOL_SAMPLES, req_id, len(matches)]
+        for symbol in matches:
+            flds += [zlib.crc32(symbol.encode()) & 0x7fffffff, symbol, 'STK',
+                'NYSE', 'USD', 2, 'OPT', 'WAR']
+        self.send(*flds)
+
+    def bars(self, symbol, end, duration, bar_size):
+        ''' Returns (time, open, high, low, close, volume) tuples '''
+        step = parse_bar_size(bar_size)
+        span = parse_duration(duration)
+
+        # Daily bars skip weekends
+        while step >= 86400 and end.weekday() >= 5:
+            end -= timedelta(days=1)
+        times = []
+        t = end
+        while len(times) < self.server.max_bars and end - t < \
+                timedelta(seconds=span):
+            if step < 86400 or t.weekday() < 5:
+                times.append(t)
+            t -= timedelta(seconds=step)
+        times.reverse()
+
+        # Serve recorded bars when a CSV file exists for the symbol
+        recorded = self.server.recorded(symbol)
+        if recorded:
+            rows = recorded[-len(times):]
+            times = times[-len(rows):]
+            result = []
+            prev_close = rows[0][0]
+            for t, (close, low, high, vol) in zip(times, rows):
+                result.append((t, prev_close, high, low, close, vol))
+                prev_close = close
+            return result
+
+        rng = random.Random(symbol + bar_size)
+        price = base_price(symbol)
+        result = []
+        for t in times:
+            close = price * math.exp(rng.gauss(0.0, 0.01))
+            high = max(price, close) * (1 + abs(rng.gauss(0.0, 0.005)))
+            low = min(price, close) * (1 - abs(rng.gauss(0.0, 0.005)))
+            result.append((t, round(price, 2), round(high, 2), round(low, 2),
+                round(close, 2), rng.randint(1000, 100000)))
+            price = close
+        return result
+
+    def historical_data(self, fields):
+        req_id = int(next(fields))
+        con = self.read_contract(fields)
+        next(fields)
+        end = parse_end(next(fields))
+        bar_size = next(fields)
+        duration = next(fields)
+        next(fields)
+        next(fields)
+        date_format = int(next(fields))
+
+        bars = self.bars(con.symbol, end, duration, bar_size)
+        flds = [IN.HISTORICAL_DATA, req_id]
+        if bars:
+            flds += [bars[0][0].strftime('%Y%m%d  %H:%M:%S'),
+                bars[-1][0].strftime('%Y%m%d  %H:%M:%S')]
+        else:
+            flds += ['', '']
+        flds.append(len(bars))
+        daily = parse_bar_size(bar_size) >= 86400
+        for t, o, h, l, c, v in bars:
+            if date_format == 2:
+                date = int(t.timestamp())
+            elif daily:
+                date = t.strftime('%Y%m%d')
+            else:
+                date = t.strftime('%Y%m%d  %H:%M:%S')
+            flds += [date, o, h, l, c, v, round((h + l + c)/3.0, 2), 1]
+        self.send(*flds)
+
+    def add_stream(self, req_id, kind, con):
+        with self.stream_lock:
+            self.streams[req_id] = [kind, con, 0]
+
+    def mkt_data(self, fields):
+        next(fields)
+        req_id = int(next(fields))
+        con = self.read_contract(fields)
+        self.add_stream(req_id, 'mkt', con)
+
+    def tick_by_tick(self, fields):
+        req_id = int(next(fields))
+        con = self.read_contract(fields)
+        tick_type = next(fields)
+        if tick_type != 'MidPoint':
+            self.send(IN.ERR_MSG, 2, req_id, 10190,
+                'Only MidPoint ticks are served')
+            return
+        self.add_stream(req_id, 'midpoint', con)
+
+    def realtime_bars(self, fields):
+        next(fields)
+        req_id = int(next(fields))
+        con = self.read_contract(fields)
+        self.add_stream(req_id, 'bar', con)
+
+    def cancel_stream(self, fields):
+        next(fields)
+        self.cancel_tick_by_tick(fields)
+
+    def cancel_tick_by_tick(self, fields):
+        req_id = int(next(fields))
+        with self.stream_lock:
+            self.streams.pop(req_id, None)
+
+    def ignore(self, fields):
+        pass
+
+    def sec_def_opt_params(self, fields):
+        req_id = int(next(fields))
+        symbol = next(fields)
+        next(fields)
+        next(fields)
+        underlying = int(next(fields) or 0)
+
+        # Monthly expirations and strikes around the current price
+        expirations = []
+        month = datetime.now().replace(day=1)
+        for _ in range(6):
+            month = (month + timedelta(days=32)).replace(day=1)
+            friday = month + timedelta(days=(4 - month.weekday()) % 7 + 14)
+            expirations.append(friday.strftime('%Y%m%d'))
+        price = self.feed(symbol).price
+        step = 5.0 if price > 50 else 1.0
+        center = round(price/step) * step
+        strikes = [center + i*step for i in range(-20, 21) if center + i*step > 0]
+        self.send(IN.SECURITY_DEFINITION_OPTION_PARAMETER, req_id, 'SMART',
+            underlying, symbol, '100', len(expirations), *expirations,
+            len(strikes), *strikes)
+        self.send(IN.SECURITY_DEFINITION_OPTION_PARAMETER_END, req_id)
+
+    def scanner(self, fields):
+        req_id = int(next(fields))
+        num_rows = int(next(fields) or 50)
+        if num_rows <= 0:
+            num_rows = 50
+        next(fields)
+        next(fields)
+        scan_code = next(fields)
+        above = parse_float(next(fields))
+        below = parse_float(next(fields))
+
+        # Rank the universe by a stable pseudo-random score
+        rows = []
+        for symbol in UNIVERSE:
+            price = self.feed(symbol).price
+            if above != UNSET_DOUBLE and price < above:
+                continue
+            if below != UNSET_DOUBLE and price > below:
+                continue
+            rows.append(symbol)
+        rows.sort(key=lambda sym: zlib.crc32((sym + scan_code).encode()))
+        rows = rows[:min(num_rows, 50)]
+        flds = [IN.SCANNER_DATA, 3, req_id, len(rows)]
+        for rank, symbol in enumerate(rows):
+            flds += [rank, zlib.crc32(symbol.encode()) & 0x7fffffff, symbol,
+                'STK', '', 0.0, '', 'SMART', 'USD', symbol, 'NMS', symbol,
+                '', '', '', '']
+        self.send(*flds)
+
+    def fundamental_data(self, fields):
+        next(fields)
+        req_id = int(next(fields))
+        next(fields)
+        symbol = next(fields)
+        price = self.feed(symbol).price
+        xml = ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<ReportSnapshot Major="1" Minor="0" Revision="1">'
+            '<CoIDs><CoID Type="CompanyName">{0} Synthetic Corp</CoID></CoIDs>'
+            '<Ratios PriceCurrency="USD" ReportingCurrency="USD">'
+            '<Group ID="Price and Volume">'
+            '<Ratio FieldName="NPRICE" Type="N">{1:.2f}</Ratio>'
+            '<Ratio FieldName="PDATE" Type="D">{2}</Ratio></Group>'
+            '<Group ID="Income Statement">'
+            '<Ratio FieldName="MKTCAP" Type="N">{3:.1f}</Ratio>'
+            '<Ratio FieldName="TTMEPSXCLX" Type="N">{4:.2f}</Ratio></Group>'
+            '</Ratios></ReportSnapshot>').format(symbol, price,
+            datetime.now().strftime('%Y-%m-%dT00:00:00'), price * 1000.0,
+            price/20.0)
+        self.send(IN.FUNDAMENTAL_DATA, 1, req_id, xml)
+
+    def place_order(self, fields):
+        order_id = int(next(fields))
+        con = self.read_contract(fields)
+        next(fields)
+        next(fields)
+        action = next(fields)
+        qty = float(next(fields))
+        order_type = next(fields)
+        lmt_price = parse_float(next(fields))
+        next(fields)
+        for _ in range(6):
+            next(fields)
+        transmit = next(fields) == '1'
+        parent_id = int(next(fields) or 0)
+        self.next_order_id = max(self.next_order_id, order_id + 1)
+        perm_id = self.server.next_perm_id()
+
+        # Held orders wait for the last leg of the group to transmit
+        if not transmit:
+            self.send(IN.ORDER_STATUS, order_id, 'PreSubmitted', 0, qty, 0.0,
+                perm_id, parent_id, 0.0, self.client_id, '', 0.0)
+            return
+        self.send(IN.ORDER_STATUS, order_id, 'Submitted', 0, qty, 0.0,
+            perm_id, parent_id, 0.0, self.client_id, '', 0.0)
+
+        # Market orders fill at once, as do marketable limit orders
+        price = self.feed(con.symbol).price
+        if order_type == 'MKT' or (order_type == 'LMT' and
+                ((action == 'BUY' and lmt_price >= price) or
+                (action == 'SELL' and lmt_price <= price))):
+            self.send(IN.ORDER_STATUS, order_id, 'Filled', qty, 0, price,
+                perm_id, parent_id, price, self.client_id, '', 0.0)
+            sign = 1 if action == 'BUY' else -1
+            pos, cost, _ = self.positions.get(con.symbol, (0.0, 0.0, con))
+            self.positions[con.symbol] = (pos + sign*qty, price, con)
+
+    def positions_data(self, fields):
+        for symbol, (pos, cost, con) in self.positions.items():
+            self.send(IN.POSITION_DATA, 3, self.server.account,
+                con.conId or con_id(con), con.symbol, con.secType,
+                con.lastTradeDateOrContractMonth, con.strike, con.right,
+                con.multiplier, con.exchange, con.currency, con.localSymbol,
+                con.tradingClass, pos, cost)
+        self.send(IN.POSITION_END, 1)
+
+    def account_summary(self, fields):
+        next(fields)
+        req_id = int(next(fields))
+        next(fields)
+        tags = next(fields).split(',')
+        for tag in tags:
+            value = self.server.account_values.get(tag)
+            if value is not None:
+                self.send(IN.ACCOUNT_SUMMARY, 1, req_id, self.server.account,
+                    tag, value, 'USD' if tag != 'AccountType' else '')
+        self.send(IN.ACCOUNT_SUMMARY_END, 1, req_id)
+
+    def account_updates(self, fields):
+        next(fields)
+        if next(fields) == '0':
+            return
+        for tag, value in self.server.account_values.items():
+            self.send(IN.ACCT_VALUE, 2, tag, value,
+                'USD' if tag != 'AccountType' else '', self.server.account)
+        for symbol, (pos, cost, con) in self.positions.items():
+            self.send(IN.PORTFOLIO_VALUE, 8, con.conId or con_id(con),
+                con.symbol, con.secType, con.lastTradeDateOrContractMonth,
+                con.strike, con.right, con.multiplier, con.primaryExchange,
+                con.currency, con.localSymbol, con.tradingClass, pos, cost,
+                pos * cost, cost, 0.0, 0.0, self.server.account)
+        self.send(IN.ACCT_DOWNLOAD_END, 1, self.server.account)
+
+    def stream(self):
+        ''' Sends ticks and bars for every open subscription '''
+        last_bar = time.time()
+        while not self.stopped.is_set():
+            with self.stream_lock:
+                streams = list(self.streams.items())
+            send_bars = time.time() - last_bar >= self.server.bar_interval
+            if send_bars:
+                last_bar = time.time()
+            try:
+                for req_id, stream in streams:
+                    kind, con, count = stream
+                    if self.server.max_ticks and count >= self.server.max_ticks:
+                        continue
+                    if kind == 'mkt':
+                        self.send_quote(req_id, con)
+                    elif kind == 'midpoint':
+                        self.send(IN.TICK_BY_TICK, req_id, 4, int(time.time()),
+                            self.feed(con.symbol).next())
+                    elif kind == 'bar' and send_bars:
+                        self.send_bar(req_id, con)
+                    else:
+                        continue
+                    stream[2] += 1
+            except OSError:
+                break
+            if self.server.tick_rate:
+                time.sleep(1.0/self.server.tick_rate)
+            elif not streams:
+                time.sleep(0.01)
+
+    def send_quote(self, req_id, con):
+        ''' Sends bid, ask and last ticks, priced as options when needed '''
+        price = self.feed(con.symbol).next()
+        if con.secType == 'OPT':
+            intrinsic = price - con.strike if con.right == 'C' \
+                else con.strike - price
+            price = round(max(intrinsic, 0.0) + 0.02 * price, 2)
+        size = self.server.rng.randint(1, 50)
+        self.send(IN.TICK_PRICE, 6, req_id, BID, round(price - 0.01, 2),
+            size, 0)
+        self.send(IN.TICK_PRICE, 6, req_id, ASK, round(price + 0.01, 2),
+            size, 0)
+        self.send(IN.TICK_PRICE, 6, req_id, LAST, price, size, 0)
+
+    def send_bar(self, req_id, con):
+        feed = self.feed(con.symbol)
+        prices = [feed.next() for _ in range(4)]
+        self.send(IN.REAL_TIME_BARS, 3, req_id, int(time.time()), prices[0],
+            max(prices), min(prices), prices[-1],
+            self.server.rng.randint(100, 10000), round(sum(prices)/4, 2),
+            self.server.rng.randint(1, 100))
+
+class TWSServer:
+    ''' Accepts client connections and starts a session for each '''
+
+    def __init__(self, host, port, tick_rate=10.0, bar_interval=5.0,
+        max_ticks=0, max_bars=5000, csv_dir=None):
+        self.host = host
+        self.port = port
+        self.tick_rate = tick_rate
+        self.bar_interval = bar_interval
+        self.max_ticks = max_ticks
+        self.max_bars = max_bars
+        self.csv_dir = csv_dir
+        self.account = 'DU000000'
+        self.account_values = {'AccountType': 'INDIVIDUAL',
+            'AvailableFunds': '1000000.00', 'BuyingPower': '4000000.00',
+            'NetLiquidation': '1000000.00', 'TotalCashValue': '1000000.00'}
+        self.rng = random.Random(0)
+        self.perm_id = 1000
+        self.perm_lock = Lock()
+        self.csv_cache = {}
+
+    def next_perm_id(self):
+        with self.perm_lock:
+            self.perm_id += 1
+            return self.perm_id
+
+    def recorded(self, symbol):
+        ''' Returns (close, low, high, volume) rows from SYMBOL.csv '''
+        if not self.csv_dir:
+            return None
+        if symbol not in self.csv_cache:
+            path = os.path.join(self.csv_dir, symbol + '.csv')
+            rows = None
+            if os.path.exists(path):
+                with open(path) as f:
+                    header = f.readline().strip().split(',')
+                    cols = [header.index(c) for c in
+                        ('CLOSE', 'LOW', 'HIGH', 'VOL')]
+                    rows = []
+                    for line in f:
+                        vals = line.strip().split(',')
+                        rows.append(tuple(float(vals[c]) for c in cols[:3]) +
+                            (int(float(vals[cols[3]])),))
+            self.csv_cache[symbol] = rows
+        return self.csv_cache[symbol]
+
+    def serve_forever(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, self.port))
+        listener.listen()
+        print('Serving on {}:{}'.format(self.host, self.port))
+        while True:
+            sock, addr = listener.accept()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            session = Session(self, sock, addr)
+            session.start()
+            Thread(target=session.stream, daemon=True).start()
+
+def main():
+
+    # Read the server settings
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7497)
+    parser.add_argument('--tick-rate', type=float, default=10.0,
+        help='ticks per second per subscription, 0 for as fast as possible')
+    parser.add_argument('--bar-interval', type=float, default=5.0,
+        help='seconds between real-time bars')
+    parser.add_argument('--ticks', type=int, default=0,
+        help='ticks sent per subscription, 0 for unlimited')
+    parser.add_argument('--max-bars', type=int, default=5000,
+        help='largest number of bars in a historical data response')
+    parser.add_argument('--csv-dir',
+        help='directory of SYMBOL.csv files with recorded daily bars')
+    args = parser.parse_args()
+
+    # Start the server
+    server = TWSServer(args.host, args.port, args.tick_rate,
+        args.bar_interval, args.ticks, args.max_bars, args.csv_dir)
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -1,72 +1,163 @@
-''' Demonstrates how an application can access details for a contract '''
-
-from threading import Thread
-import time
-
-from ibapi.client import EClient, Contract
-from ibapi.wrapper import EWrapper
-from ibapi.utils import iswrapper
-
-class ContractReader(EWrapper, EClient):
-    ''' Serves as the client and the wrapper '''
-
-    def __init__(self, addr, port, client_id):
-        EClient. __init__(self, self)
-
-        # Connect to TWS
-        self.connect(addr, port, client_id)
-
-        # Launch the client thread
-        thread = Thread(target=self.run)
-        thread.start()
-
-    @iswrapper
-    def symbolSamples(self, reqId, descs):
-    
-        # Print the symbols in the returned results
-        print('Number of descriptions: {}'.format(len(descs)))
-        for desc in descs:
-            print('Symbol: {}'.format(desc.contract.symbol))
-
-        # Choose the first symbol
-        self.symbol = descs[0].contract.symbol
-
-    @iswrapper
-    def contractDetails(self, reqId, details):
-        print('Long name: {}'.format(details.longName))
-        print('Category: {}'.format(details.category))
-        print('Subcategory: {}'.format(details.subcategory))        
-        print('Contract ID: {}\n'.format(details.contract.conId))
-
-    @iswrapper
-    def contractDetailsEnd(self, reqId):
-        print('The End')
-
-    @iswrapper        
-    def error(self, reqId, code, msg):
-        print('Error {}: {}'.format(code, msg))
-        
-def main():
-
-    # Create the client and connect to TWS
-    client = ContractReader('127.0.0.1', 7497, 0)
-    time.sleep(0.5)
-    
-    # Request descriptions of contracts related to cheesecake    
-    client.reqMatchingSymbols(0, 'Cheesecake')    
-    time.sleep(3)   
-    
-    # Request details for the stock
-    contract = Contract()
-    contract.symbol = client.symbol
-    contract.secType = "OPT"
-    contract.exchange = "SMART"
-    contract.currency = "USD"
-    client.reqContractDetails(1, contract)
-    
-     # Sleep while the request is processed
-    time.sleep(3)       
-    client.disconnect()
-
-if __name__ == '__main__':
-    main()
+''' Demonstrates how an application can access details for a contract '''
+
+from concurrent.futures import wait
+from queue import Queue, Empty
+from threading import Thread
+import os
+import sys
+
+from ibapi.client import EClient, Contract
+from ibapi.wrapper import EWrapper
+from ibapi.utils import iswrapper
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.contract_cache import ContractCache, DetailsLookup
+from common.pending import RequestTracker
+
+from symbol_index import SymbolIndex
+
+class ContractReader(RequestTracker, DetailsLookup, EWrapper, EClient):
+    ''' Serves as the client and the wrapper '''
+
+    def __init__(self, addr, port, client_id, cache=None, index=None):
+        EClient. __init__(self, self)
+
+        # Symbol lookups answered locally, and patterns sent to TWS
+        self.index = index
+        self.patterns = {}
+
+        # Futures for pending requests, and the cache of contract details
+        RequestTracker.__init__(self)
+        DetailsLookup.__init__(self, cache)
+        self.connected = self.expect('nextValidId')
+
+        # Connect to TWS
+        self.connect(addr, port, client_id)
+
+        # Launch the client thread
+        thread = Thread(target=self.run)
+        thread.start()
+
+    @iswrapper
+    def nextValidId(self, order_id):
+        ''' Called once the connection to TWS is ready '''
+        self.resolve('nextValidId', order_id)
+
+    @iswrapper
+    def symbolSamples(self, reqId, descs):
+        pattern = self.patterns.pop(reqId, None)
+        if self.index is not None and pattern is not None:
+            self.index.add(pattern, descs)
+        self.resolve(reqId, descs)
+
+    def find_symbols(self, req_id, pattern, timeout=3):
+        ''' Returns the symbols the index finds for a pattern, and requests
+            matching symbols from TWS only on a miss '''
+        if self.index is not None:
+            descs = self.index.search(pattern)
+
+            # An empty answer TWS already gave is not a miss
+            if descs or self.index.lookup(pattern) is not None:
+                return descs
+
+        # Request matching symbols and wait for symbolSamples
+        done = self.expect(req_id)
+        self.patterns[req_id] = pattern
+        self.reqMatchingSymbols(req_id, pattern)
+        wait([done], timeout=timeout)
+        return (done.done() and done.result()) or []
+
+    def get_all_details(self, first_id, contracts, max_in_flight=20,
+        timeout=10):
+        ''' Yields (contract, details) pairs as each request completes '''
+        contracts = iter(contracts)
+        in_flight = {}
+        finished = Queue()
+        req_id = first_id
+        try:
+            while True:
+
+                # Send requests until the in-flight limit is reached
+                while len(in_flight) < max_in_flight:
+                    contract = next(contracts, None)
+                    if contract is None:
+                        break
+                    details = self.cache.get(contract) if self.cache \
+                        else None
+                    if details is not None:
+                        yield contract, details
+                        continue
+                    done = self.expect(req_id)
+                    done.add_done_callback(
+                        lambda future, req_id=req_id:
+                            finished.put((req_id, future.result())))
+                    in_flight[req_id] = contract
+                    self.contracts[req_id] = contract
+                    self.reqContractDetails(req_id, contract)
+                    req_id += 1
+                if not in_flight:
+                    return
+
+                # Wait for the next request to complete
+                try:
+                    done_id, details = finished.get(timeout=timeout)
+                except Empty:
+
+                    # Give up on every request still in flight
+                    abandoned = list(in_flight.items())
+                    self.forget(in_flight)
+                    for done_id, contract in abandoned:
+                        yield contract, []
+                    continue
+
+                # Skip requests that completed after they were abandoned
+                if done_id in in_flight:
+                    yield in_flight.pop(done_id), details or []
+        finally:
+            self.forget(in_flight)
+
+    def forget(self, in_flight):
+        ''' Drops the futures and contracts of abandoned requests, TWS has
+            no way to cancel a contract details request '''
+        for req_id in in_flight:
+            self.pending.pop(req_id, None)
+            self.contracts.pop(req_id, None)
+            self.details.pop(req_id, None)
+        in_flight.clear()
+
+def print_details(details):
+    for desc in details:
+        print('Long name: {}'.format(desc.longName))
+        print('Category: {}'.format(desc.category))
+        print('Subcategory: {}'.format(desc.subcategory))
+        print('Contract ID: {}\n'.format(desc.contract.conId))
+    print('The End')
+
+def main():
+
+    # Create the client and connect to TWS
+    index = SymbolIndex.load('symbols.pkl')
+    client = ContractReader('127.0.0.1', 7497, 0, ContractCache(), index)
+    wait([client.connected], timeout=5)
+    
+    # Request descriptions of contracts related to cheesecake    
+    descs = client.find_symbols(0, 'Cheesecake')
+    index.save('symbols.pkl')
+
+    # Print the symbols in the returned results
+    print('Number of descriptions: {}'.format(len(descs)))
+    for desc in descs:
+        print('Symbol: {}'.format(desc.contract.symbol))
+    
+    # Request details for the first stock
+    contract = Contract()
+    contract.symbol = descs[0].contract.symbol
+    contract.secType = "OPT"
+    contract.exchange = "SMART"
+    contract.currency = "USD"
+    print_details(client.get_details(1, contract))
+    client.disconnect()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+''' Demonstrates how an application can resolve many contracts at once '''
+
+from concurrent.futures import wait
+import argparse
+import time
+
+from ibapi.client import Contract
+
+from contract_reader import ContractReader
+
+def main():
+
+    # Read the symbols, one per line, and the in-flight limit
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('symbols', nargs='?', help='file of symbols')
+    parser.add_argument('--max-in-flight', type=int, default=20)
+    args = parser.parse_args()
+    if args.symbols:
+        with open(args.symbols) as file:
+            symbols = [line.strip() for line in file if line.strip()]
+    else:
+        symbols = ['IBM', 'AAPL', 'MSFT', 'GOOG', 'AMZN', 'NVDA', 'META']
+
+    # Create the client and connect to TWS
+    client = ContractReader('127.0.0.1', 7497, 0)
+    wait([client.connected], timeout=5)
+
+    # Create a contract template for each stock
+    contracts = []
+    for symbol in symbols:
+        contract = Contract()
+        contract.symbol = symbol
+        contract.secType = 'STK'
+        contract.exchange = 'SMART'
+        contract.currency = 'USD'
+        contracts.append(contract)
+
+    # Print contract IDs as the requests complete
+    start = time.perf_counter()
+    con_ids = {}
+    for contract, details in client.get_all_details(1, contracts,
+        args.max_in_flight):
+        if details:
+            con_ids[contract.symbol] = details[0].contract.conId
+            print('{}: {}'.format(contract.symbol, con_ids[contract.symbol]))
+        else:
+            print('{}: not found'.format(contract.symbol))
+    print('Resolved {} of {} contracts in {:.3f} seconds'.format(
+        len(con_ids), len(contracts), time.perf_counter() - start))
+
+    # Disconnect from TWS
+    client.disconnect()
+
+if __name__ == '__main__':
+    main()
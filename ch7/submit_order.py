@@ -1,103 +1,169 @@
-''' Demonstrates how an application can submit orders and request information '''
-
-from threading import Thread
-import sys
-import time
-
-from ibapi.client import EClient, Contract
-from ibapi.order import Order
-from ibapi.wrapper import EWrapper
-from ibapi.utils import iswrapper
-
-class SubmitOrder(EWrapper, EClient):
-    ''' Serves as the client and the wrapper '''
-
-    def __init__(self, addr, port, client_id):
-        EClient. __init__(self, self)
-        self.order_id = None
-
-        # Connect to TWS
-        self.connect(addr, port, client_id)
-
-        # Launch the client thread
-        thread = Thread(target=self.run)
-        thread.start()
-
-    @iswrapper
-    def nextValidId(self, order_id):
-        ''' Provides the next order ID '''
-        self.order_id = order_id
-        print('Order ID: '.format(order_id))
-
-    @iswrapper
-    def openOrder(self,order_id, contract, order, state):
-        ''' Called in response to the submitted order '''
-        print('Order status: '.format(state.status))
-        print('Commission charged: '.format(state.commission))
-
-    @iswrapper
-    def orderStatus(self,order_id, status, filled, remaining, avgFillPrice, \
-        permId, parentId, lastFillPrice, clientId, whyHeld, mktCapPrice):
-        ''' Check the status of the subnitted order '''
-        print('Number of filled positions: {}'.format(filled))
-        print('Average fill price: {}'.format(avgFillPrice))
-
-    @iswrapper
-    def position(self,account, contract, pos, avgCost):
-        ''' Read information about the account's open positions '''
-        print('Position in {}: {}'.format(contract.symbol, pos))
-
-    @iswrapper
-    def accountSummary(self, req_id, account, tag, value, currency):
-        ''' Read information about the account '''
-        print('Account {}: {} = {}'.format(account, tag, value))
-
-    @iswrapper
-    def error(self, req_id, code, msg):
-        print('Error {}: {}'.format(code, msg))
-
-def main():
-
-    # Create the client and connect to TWS
-    client = SubmitOrder('127.0.0.1', 7497, 0)
-
-    # Define a contract for Apple stock
-    contract = Contract()
-    contract.symbol = 'AAPL'
-    contract.secType = 'STK'
-    contract.exchange = 'SMART'
-    contract.currency = 'USD'
-
-    # Define the limit order
-    order = Order()
-    order.action = 'BUY'
-    order.totalQuantity = 200
-    order.orderType = 'LMT'
-    order.lmtPrice = 150
-    order.transmit = False
-
-    # Obtain a valid ID for the order
-    client.reqIds(1)
-    time.sleep(2)
-
-    # Place the order
-    if client.order_id:
-        client.placeOrder(client.order_id, contract, order)
-        time.sleep(5)
-    else:
-        print('Order ID not received. Ending application.')
-        sys.exit()
-
-    # Obtain information about open positions
-    client.reqPositions()
-    time.sleep(2)
-
-    # Obtain information about account
-    client.reqAccountSummary(0, 'All', 'AccountType,AvailableFunds')
-    time.sleep(2)
-
-    # Disconnect from TWS
-    client.disconnect()
-
-if __name__ == '__main__':
-    main()
+''' Demonstrates how an application can submit orders and request information '''
+
+from concurrent.futures import wait
+from threading import Thread
+import os
+import sys
+
+from ibapi.client import EClient, Contract
+from ibapi.order import Order
+from ibapi.wrapper import EWrapper
+from ibapi.utils import iswrapper
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.account_snapshot import AccountSnapshot
+from common.contract_cache import DetailsLookup
+from common.order_ids import OrderIds
+from common.order_store import OrderStore
+from common.pending import RequestTracker
+
+class SubmitOrder(RequestTracker, OrderIds, DetailsLookup, EWrapper, EClient):
+    ''' Serves as the client and the wrapper '''
+
+    def __init__(self, addr, port, client_id):
+        EClient. __init__(self, self)
+
+        # Order IDs are reserved locally after TWS provides the first
+        OrderIds.__init__(self)
+
+        # State of the orders submitted by this client
+        self.orders = OrderStore()
+        self.account = AccountSnapshot()
+
+        # Futures for pending requests, and the contract details lookup
+        RequestTracker.__init__(self)
+        DetailsLookup.__init__(self)
+        self.connected = self.expect('nextValidId')
+
+        # Connect to TWS
+        self.connect(addr, port, client_id)
+
+        # Launch the client thread
+        thread = Thread(target=self.run)
+        thread.start()
+
+    @iswrapper
+    def openOrder(self,order_id, contract, order, state):
+        ''' Called in response to the submitted order '''
+        self.orders.on_open_order(order_id, contract, order, state)
+        print('Order status: '.format(state.status))
+        print('Commission charged: '.format(state.commission))
+        self.resolve_order(order_id, state)
+
+    @iswrapper
+    def orderStatus(self,order_id, status, filled, remaining, avgFillPrice, \
+        permId, parentId, lastFillPrice, clientId, whyHeld, mktCapPrice):
+        ''' Check the status of the subnitted order '''
+        self.orders.on_order_status(order_id, status, filled, remaining,
+            avgFillPrice, permId, parentId)
+        print('Number of filled positions: {}'.format(filled))
+        print('Average fill price: {}'.format(avgFillPrice))
+
+    @iswrapper
+    def execDetails(self, req_id, contract, execution):
+        ''' Called when an order is filled '''
+        self.orders.on_execution(contract, execution)
+
+    @iswrapper
+    def position(self,account, contract, pos, avgCost):
+        ''' Read information about the account's open positions '''
+        self.account.on_position(account, contract, pos, avgCost)
+
+    @iswrapper
+    def positionEnd(self):
+        ''' Called after all positions have been received '''
+        self.account.on_position_end()
+
+    @iswrapper
+    def updatePortfolio(self, contract, pos, marketPrice, marketValue,
+        averageCost, unrealizedPNL, realizedPNL, account):
+        ''' Read a position from the account updates '''
+        self.account.on_portfolio(contract, pos, averageCost, account)
+
+    @iswrapper
+    def updateAccountValue(self, tag, value, currency, account):
+        ''' Read an account value from the account updates '''
+        self.account.on_account_value(tag, value, currency, account)
+
+    @iswrapper
+    def accountDownloadEnd(self, account):
+        ''' Called after the account updates have been received '''
+        self.account.on_account_download_end(account)
+
+    @iswrapper
+    def accountSummary(self, req_id, account, tag, value, currency):
+        ''' Read information about the account '''
+        self.account.on_account_summary(account, tag, value, currency)
+
+    @iswrapper
+    def accountSummaryEnd(self, req_id):
+        ''' Called after the account summary has been received '''
+        self.account.on_account_summary_end()
+
+    def place_order(self, order_id, contract, order):
+        ''' Records an order and submits it to TWS '''
+        self.orders.on_place(order_id, contract, order)
+        self.placeOrder(order_id, contract, order)
+
+def main():
+
+    # Create the client and connect to TWS
+    client = SubmitOrder('127.0.0.1', 7497, 0)
+
+    # Define a contract for Apple stock
+    contract = Contract()
+    contract.symbol = 'AAPL'
+    contract.secType = 'STK'
+    contract.exchange = 'SMART'
+    contract.currency = 'USD'
+
+    # Define the limit order
+    order = Order()
+    order.action = 'BUY'
+    order.totalQuantity = 200
+    order.orderType = 'LMT'
+    order.lmtPrice = 150
+    order.transmit = False
+
+    # Wait for TWS to provide the first order ID
+    wait([client.connected], timeout=2)
+
+    # Obtain the contract ID that identifies the order's contract
+    details = client.get_details(1, contract)
+    if details:
+        contract.conId = details[0].contract.conId
+
+    # Place the order
+    if client.next_id is not None:
+        order_id = client.reserve_ids()
+        done = client.expect_order(order_id)
+        client.place_order(order_id, contract, order)
+        wait([done], timeout=5)
+        print(client.orders.get(order_id))
+        print('Open AAPL quantity: {}'.format(
+            client.orders.exposure(contract.conId)))
+    else:
+        print('Order ID not received. Ending application.')
+        sys.exit()
+
+    # Subscribe to the positions and values of the account
+    client.reqAccountUpdates(True, '')
+    client.account.wait_ready(timeout=2)
+
+    # Read the snapshot without further requests
+    positions, values = client.account.snapshot()
+    for (account, con_id), (con, pos, avg_cost) in positions.items():
+        print('Position in {}: {}'.format(con.symbol, pos))
+    for tag, accounts in values.items():
+        for account, (value, currency) in accounts.items():
+            print('Account {}: {} = {}'.format(account, tag, value))
+    print('Available funds: {}'.format(
+        client.account.value('AvailableFunds')))
+
+    # Disconnect from TWS
+    client.reqAccountUpdates(False, '')
+    client.disconnect()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+''' Answers symbol lookups from the results of earlier reqMatchingSymbols calls '''
+from bisect import bisect_left, insort
+from collections import Counter
+from threading import Lock
+import pickle
+
+def trigrams(text):
+    ''' Returns the three-character substrings of a padded string '''
+    padded = '  {} '.format(text)
+    return {padded[i:i+3] for i in range(len(padded) - 2)}
+
+class SymbolIndex:
+    ''' Indexes ContractDescriptions by symbol prefix and trigram '''
+
+    def __init__(self):
+        self.lock = Lock()
+
+        # Descriptions keyed by contract ID
+        self.descs = {}
+
+        # Sorted (symbol, conId) pairs for prefix lookups
+        self.symbols = []
+
+        # Contract IDs keyed by trigram for fuzzy lookups
+        self.grams = {}
+
+        # Results of the patterns sent to TWS
+        self.queries = {}
+
+    def add(self, pattern, descs):
+        ''' Stores the descriptions TWS returned for a pattern '''
+        with self.lock:
+            self.queries[pattern.upper()] = \
+                [desc.contract.conId for desc in descs]
+            for desc in descs:
+                con_id = desc.contract.conId
+                symbol = desc.contract.symbol.upper()
+                if con_id not in self.descs:
+                    insort(self.symbols, (symbol, con_id))
+                    for gram in trigrams(symbol):
+                        self.grams.setdefault(gram, set()).add(con_id)
+                self.descs[con_id] = desc
+
+    def lookup(self, pattern):
+        ''' Returns the descriptions TWS returned for the same pattern, or
+            None if the pattern has not been sent '''
+        with self.lock:
+            con_ids = self.queries.get(pattern.upper())
+            if con_ids is None:
+                return None
+            return [self.descs[con_id] for con_id in con_ids]
+
+    def search(self, pattern, limit=16):
+        ''' Returns matching descriptions, or an empty list on a miss '''
+        pattern = pattern.upper()
+        with self.lock:
+
+            # Repeat the answer to a pattern already sent to TWS
+            if pattern in self.queries:
+                return [self.descs[con_id]
+                    for con_id in self.queries[pattern][:limit]]
+
+            # Find symbols starting with the pattern
+            con_ids = []
+            pos = bisect_left(self.symbols, (pattern,))
+            while pos < len(self.symbols) and len(con_ids) < limit and \
+                self.symbols[pos][0].startswith(pattern):
+                con_ids.append(self.symbols[pos][1])
+                pos += 1
+            if con_ids or len(pattern) < 3:
+                return [self.descs[con_id] for con_id in con_ids]
+
+            # A symbol sharing half the trigrams must contain one of the
+            # rarest, so candidates are drawn from those postings only
+            postings = sorted((self.grams.get(gram, set())
+                for gram in trigrams(pattern)), key=len)
+            min_score = max(1, len(postings) // 2)
+            candidates = set().union(*postings[:len(postings) - min_score + 1])
+
+            # Rank the candidates by the number of trigrams they share
+            scores = Counter({con_id: sum(con_id in posting
+                for posting in postings) for con_id in candidates})
+            return [self.descs[con_id]
+                for con_id, score in scores.most_common(limit)
+                if score >= min_score]
+
+    def save(self, path):
+        ''' Writes the descriptions and patterns to a file '''
+        with self.lock:
+            with open(path, 'wb') as file:
+                pickle.dump((self.queries, list(self.descs.values())), file)
+
+    @classmethod
+    def load(cls, path):
+        ''' Creates an index from a file written by save '''
+        index = cls()
+        try:
+            with open(path, 'rb') as file:
+                queries, descs = pickle.load(file)
+        except FileNotFoundError:
+            return index
+        index.add('', descs)
+        index.queries = queries
+        return index
+
+    def __len__(self):
+        return len(self.descs)
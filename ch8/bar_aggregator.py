@@ -0,0 +1,79 @@
+''' Builds OHLCV bars at several intervals from streaming ticks and bars '''
+from collections import deque
+
+from ibapi.common import BarData
+
+class BarAggregator:
+    ''' Updates a bar for each request ID and interval as data arrives '''
+
+    def __init__(self, intervals=(5, 60, 300, 3600), max_bars=1000,
+        on_bar=None):
+        self.intervals = intervals
+        self.max_bars = max_bars
+
+        # Called with (req_id, interval, bar) when a bar is complete
+        self.on_bar = on_bar
+
+        # Open bars and completed bars, keyed by (req_id, interval)
+        self.current = {}
+        self.completed = {}
+
+    def add_tick(self, req_id, tick_time, price, size=0):
+        ''' Applies a trade or midpoint tick to every interval '''
+        for interval in self.intervals:
+            bar = self.bar_for(req_id, interval, tick_time, price)
+            bar.high = max(bar.high, price)
+            bar.low = min(bar.low, price)
+            bar.close = price
+            bar.volume += size
+            bar.barCount += 1
+
+    def add_bar(self, req_id, bar_time, open, high, low, close, volume,
+        count=0, bar_size=5):
+        ''' Applies a bar, such as a real-time bar, to longer intervals '''
+        for interval in self.intervals:
+            if interval < bar_size:
+                continue
+            bar = self.bar_for(req_id, interval, bar_time, open)
+            bar.high = max(bar.high, high)
+            bar.low = min(bar.low, low)
+            bar.close = close
+            bar.volume += volume
+            bar.barCount += count
+
+    def bar_for(self, req_id, interval, data_time, open):
+        ''' Returns the open bar containing a time, completing older bars '''
+        key = (req_id, interval)
+        start = int(data_time) - int(data_time) % interval
+        bar = self.current.get(key)
+        if bar is not None and int(bar.date) == start:
+            return bar
+        if bar is not None:
+            self.complete(key, bar)
+
+        # Start a new bar
+        bar = BarData()
+        bar.date = str(start)
+        bar.open = bar.high = bar.low = bar.close = open
+        bar.volume = 0
+        bar.barCount = 0
+        self.current[key] = bar
+        return bar
+
+    def close_bars(self, now):
+        ''' Completes every open bar whose interval ended before now '''
+        for key, bar in list(self.current.items()):
+            if int(bar.date) + key[1] <= now:
+                del self.current[key]
+                self.complete(key, bar)
+
+    def complete(self, key, bar):
+        if key not in self.completed:
+            self.completed[key] = deque(maxlen=self.max_bars)
+        self.completed[key].append(bar)
+        if self.on_bar:
+            self.on_bar(key[0], key[1], bar)
+
+    def bars(self, req_id, interval):
+        ''' Returns the completed bars of an interval, oldest first '''
+        return list(self.completed.get((req_id, interval), ()))
@@ -0,0 +1,176 @@
+''' Parses fundamental data reports and caches the results on disk '''
+from collections import namedtuple
+from datetime import datetime, timedelta
+from io import BytesIO
+from threading import Lock
+import pickle
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+
+# One value of a ReportsFinSummary series
+FinRow = namedtuple('FinRow', 'as_of report_type period value')
+
+class Snapshot:
+    ''' Holds the fields of a ReportSnapshot report '''
+
+    def __init__(self):
+        self.company_name = ''
+        self.ticker = ''
+        self.exchange = ''
+        self.currency = ''
+        self.latest_annual = None
+        self.latest_interim = None
+        self.ratios = {}
+        self.forecasts = {}
+
+    def report_date(self):
+        ''' Returns the date of the latest financial statements '''
+        dates = [d for d in (self.latest_annual, self.latest_interim) if d]
+        return max(dates) if dates else None
+
+    def __repr__(self):
+        return 'Snapshot({}, {} ratios, reported {})'.format(
+            self.company_name, len(self.ratios), self.report_date())
+
+class FinSummary:
+    ''' Holds the series of a ReportsFinSummary report '''
+
+    def __init__(self):
+        self.eps = []
+        self.revenue = []
+        self.dividend_per_share = []
+
+    def report_date(self):
+        ''' Returns the date of the latest value in any series '''
+        dates = [row.as_of for rows in (self.eps, self.revenue,
+            self.dividend_per_share) for row in rows]
+        return max(dates) if dates else None
+
+    def __repr__(self):
+        return 'FinSummary({} EPS, {} revenue, {} dividend rows)'.format(
+            len(self.eps), len(self.revenue), len(self.dividend_per_share))
+
+def parse_date(text):
+    ''' Reads the date at the start of an ISO date or time string '''
+    try:
+        return datetime.strptime(text[:10], '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+def parse_value(text, value_type='N'):
+    ''' Converts a value according to its N (number), D or S type '''
+    if text is None:
+        return None
+    text = text.strip()
+    if value_type == 'N':
+        try:
+            return float(text)
+        except ValueError:
+            return None
+    if value_type == 'D':
+        return parse_date(text)
+    return text
+
+def iter_elements(xml):
+    ''' Yields elements as their end tags are read, then frees them '''
+    source = BytesIO(xml.encode('utf-8') if isinstance(xml, str) else xml)
+    for _, elem in ET.iterparse(source, events=('end',)):
+        yield elem
+
+def parse_snapshot(xml):
+    ''' Reads a ReportSnapshot into a Snapshot '''
+    snap = Snapshot()
+    for elem in iter_elements(xml):
+        tag = elem.tag
+        if tag == 'CoID' and elem.get('Type') == 'CompanyName':
+            snap.company_name = (elem.text or '').strip()
+        elif tag == 'IssueID' and elem.get('Type') == 'Ticker':
+            snap.ticker = snap.ticker or (elem.text or '').strip()
+        elif tag == 'Exchange':
+            snap.exchange = snap.exchange or elem.get('Code', '')
+        elif tag == 'LatestAvailableAnnual':
+            snap.latest_annual = parse_date(elem.text)
+        elif tag == 'LatestAvailableInterim':
+            snap.latest_interim = parse_date(elem.text)
+        elif tag == 'Ratio' and elem.get('FieldName'):
+            value_elem = elem.find('Value')
+            if value_elem is not None:
+                snap.forecasts[elem.get('FieldName')] = parse_value(
+                    value_elem.text, elem.get('Type', 'N'))
+            else:
+                snap.ratios[elem.get('FieldName')] = parse_value(
+                    elem.text, elem.get('Type', 'N'))
+        elif tag == 'Ratios':
+            snap.currency = elem.get('ReportingCurrency', '')
+            snap.latest_annual = snap.latest_annual or \
+                parse_date(elem.get('LatestAvailableDate'))
+        else:
+            continue
+
+        # Free the subtree once its values have been read
+        elem.clear()
+    return snap
+
+def parse_fin_summary(xml):
+    ''' Reads a ReportsFinSummary into a FinSummary '''
+    summary = FinSummary()
+    series = {'EPS': summary.eps, 'TotalRevenue': summary.revenue,
+        'DividendPerShare': summary.dividend_per_share}
+    for elem in iter_elements(xml):
+        rows = series.get(elem.tag)
+        if rows is not None:
+            rows.append(FinRow(parse_date(elem.get('asofDate')),
+                elem.get('reportType', ''), elem.get('period', ''),
+                parse_value(elem.text)))
+            elem.clear()
+    return summary
+
+# Parsers keyed by report type
+PARSERS = {'ReportSnapshot': parse_snapshot,
+    'ReportsFinSummary': parse_fin_summary}
+
+class FundamentalsCache:
+    ''' Stores parsed reports in SQLite, keyed by contract and report type '''
+
+    def __init__(self, path='fundamentals.db', report_interval=91,
+        filing_lag=45, max_age=30):
+
+        # A newer report is expected report_interval + filing_lag days
+        # after the latest report date
+        self.next_report = timedelta(days=report_interval + filing_lag)
+        self.max_age = max_age * 86400.0
+        self.lock = Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS fundamentals (con_id TEXT, '
+            'report_type TEXT, fetched REAL, record BLOB, '
+            'PRIMARY KEY (con_id, report_type))')
+        self.db.commit()
+
+    def get(self, con_id, report_type):
+        ''' Returns the cached record, or None if a newer one may exist '''
+        with self.lock:
+            row = self.db.execute('SELECT fetched, record FROM fundamentals '
+                'WHERE con_id = ? AND report_type = ?',
+                (str(con_id), report_type)).fetchone()
+        if row is None:
+            return None
+        fetched, record = row[0], pickle.loads(row[1])
+        if time.time() - fetched > self.max_age:
+            return None
+
+        # Refresh once the next report should have been published
+        report_date = record.report_date()
+        if report_date is not None:
+            due = datetime.combine(report_date + self.next_report,
+                datetime.min.time()).timestamp()
+            if fetched < due <= time.time():
+                return None
+        return record
+
+    def put(self, con_id, report_type, record):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO fundamentals '
+                'VALUES (?, ?, ?, ?)', (str(con_id), report_type, time.time(),
+                pickle.dumps(record)))
+            self.db.commit()
@@ -1,100 +1,202 @@
-''' Demonstrates different ways to request financial data '''
-from datetime import datetime
-from threading import Thread
-import time
-
-from ibapi.client import EClient, Contract
-from ibapi.wrapper import EWrapper
-from ibapi.utils import iswrapper
-
-class MarketReader(EWrapper, EClient):
-    ''' Serves as the client and the wrapper '''
-
-    def __init__(self, addr, port, client_id):
-        EClient. __init__(self, self)
-
-        # Connect to TWS
-        self.connect(addr, port, client_id)
-
-        # Launch the client thread
-        thread = Thread(target=self.run)
-        thread.start()
-
-    @iswrapper
-    def tickByTickMidPoint(self, reqId, tick_time, midpoint):
-        ''' Called in response to reqTickByTickData '''
-
-        print('tickByTickMidPoint - Midpoint tick: {}'.format(midpoint))
-
-    @iswrapper
-    def tickPrice(self, reqId, field, price, attribs):
-        ''' Called in response to reqMktData '''
-
-        print('tickPrice - field: {}, price: {}'.format(field, price))
-
-    @iswrapper
-    def tickSize(self, reqId, field, size):
-        ''' Called in response to reqMktData '''
-
-        print('tickSize - field: {}, size: {}'.format(field, size))
-
-    @iswrapper
-    def realtimeBar(self, reqId, time, open, high, low, close, volume, WAP, count):
-        ''' Called in response to reqRealTimeBars '''
-
-        print('realtimeBar - Opening price: {}'.format(open))
-
-    @iswrapper
-    def historicalData(self, reqId, bar):
-        ''' Called in response to reqHistoricalData '''
-
-        print('historicalData - Close price: {}'.format(bar.close))
-
-    @iswrapper
-    def fundamentalData(self, reqId, data):
-        ''' Called in response to reqFundamentalData '''
-
-        print('Fundamental data: ' + data)
-
-    def error(self, reqId, code, msg):
-        ''' Called if an error occurs '''
-
-        print('Error {}: {}'.format(code, msg))
-
-def main():
-
-    # Create the client and connect to TWS
-    client = MarketReader('127.0.0.1', 7497, 0)
-
-    # Request the current time
-    con = Contract()
-    con.symbol = 'IBM'
-    con.secType = 'STK'
-    con.exchange = 'SMART'
-    con.currency = 'USD'
-
-    # Request ten ticks containing midpoint data
-    client.reqTickByTickData(0, con, 'MidPoint', 10, True)
-
-    # Request market data
-    client.reqMktData(1, con, '', False, False, [])
-
-    # Request current bars
-    client.reqRealTimeBars(2, con, 5, 'MIDPOINT', True, [])
-
-    # Request historical bars
-    now = datetime.now().strftime("%Y%m%d, %H:%M:%S")
-    client.reqHistoricalData(3, con, now, '2 w', '1 day',
-        'MIDPOINT', False, 1, False, [])
-
-    # Request fundamental data
-    client.reqFundamentalData(4, con, 'ReportSnapshot', [])
-
-    # Sleep while the requests are processed
-    time.sleep(5)
-
-    # Disconnect from TWS
-    client.disconnect()
-
-if __name__ == '__main__':
+''' Demonstrates different ways to request financial data '''
+from concurrent.futures import Future, wait
+from datetime import datetime
+from threading import Thread
+import argparse
+import os
+import sys
+
+from ibapi.client import EClient, Contract
+from ibapi.wrapper import EWrapper
+from ibapi.utils import iswrapper
+from ibapi.ticktype import TickTypeEnum
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pending import RequestTracker
+
+from bar_aggregator import BarAggregator
+from fundamentals import FundamentalsCache, PARSERS
+from tick_buffer import TickStore
+from tick_recorder import TickRecorder, TickReplayer
+
+class MarketReader(RequestTracker, EWrapper, EClient):
+    ''' Serves as the client and the wrapper '''
+
+    def __init__(self, addr, port, client_id, recorder=None):
+        EClient. __init__(self, self)
+
+        # Writes every tick to a file if set
+        self.recorder = recorder
+
+        # Ring buffers of ticks, keyed by request ID and field
+        self.ticks = TickStore()
+        self.num_ticks = 10
+
+        # Intraday bars built from the midpoint ticks and real-time bars
+        self.bars = BarAggregator()
+
+        # Parsed fundamental reports and the requests that will fill them
+        self.fundamentals = FundamentalsCache()
+        self.reports = {}
+
+        # Futures for pending requests, keyed by request ID
+        RequestTracker.__init__(self)
+
+        # Connect to TWS unless ticks will be replayed from a file
+        if addr is not None:
+            self.connect(addr, port, client_id)
+
+            # Launch the client thread
+            thread = Thread(target=self.run)
+            thread.start()
+
+    @iswrapper
+    def tickByTickMidPoint(self, reqId, tick_time, midpoint):
+        ''' Called in response to reqTickByTickData '''
+
+        if self.recorder:
+            self.recorder.midpoint(reqId, tick_time, midpoint)
+        self.ticks.add(reqId, 'MidPoint', midpoint, tick_time=tick_time)
+        self.bars.add_tick(reqId, tick_time, midpoint)
+        if len(self.ticks.buffer(reqId, 'MidPoint')) == self.num_ticks:
+            self.resolve(reqId)
+
+    @iswrapper
+    def tickPrice(self, reqId, field, price, attribs):
+        ''' Called in response to reqMktData '''
+
+        if self.recorder:
+            self.recorder.tick_price(reqId, field, price, attribs)
+        self.ticks.add(reqId, field, price)
+
+    @iswrapper
+    def tickSize(self, reqId, field, size):
+        ''' Called in response to reqMktData '''
+
+        if self.recorder:
+            self.recorder.tick_size(reqId, field, size)
+        self.ticks.add(reqId, field, 0.0, size)
+
+    @iswrapper
+    def realtimeBar(self, reqId, time, open, high, low, close, volume, WAP, count):
+        ''' Called in response to reqRealTimeBars '''
+
+        if self.recorder:
+            self.recorder.realtime_bar(reqId, time, open, high, low, close,
+                volume, WAP, count)
+        self.ticks.add(reqId, 'RealTimeBar', close, volume, time)
+        self.bars.add_bar(reqId, time, open, high, low, close, volume, count)
+
+    @iswrapper
+    def historicalData(self, reqId, bar):
+        ''' Called in response to reqHistoricalData '''
+
+        print('historicalData - Close price: {}'.format(bar.close))
+
+    @iswrapper
+    def historicalDataEnd(self, reqId, start, end):
+        ''' Called after historical data has been received '''
+
+        self.resolve(reqId)
+
+    @iswrapper
+    def fundamentalData(self, reqId, data):
+        ''' Called in response to reqFundamentalData '''
+
+        con_id, report_type = self.reports.pop(reqId, (None, None))
+        if report_type not in PARSERS:
+            self.resolve(reqId, data)
+            return
+
+        # Parse the report and store the result for later runs
+        record = PARSERS[report_type](data)
+        self.fundamentals.put(con_id, report_type, record)
+        self.resolve(reqId, record)
+
+    def request_fundamentals(self, req_id, contract, report_type):
+        ''' Returns a future for a report, requesting it if not cached '''
+        con_id = contract.conId or contract.symbol
+        record = self.fundamentals.get(con_id, report_type)
+        if record is not None:
+            future = Future()
+            future.set_result(record)
+            return future
+        self.reports[req_id] = (con_id, report_type)
+        future = self.expect(req_id)
+        self.reqFundamentalData(req_id, contract, report_type, [])
+        return future
+
+def print_ticks(client):
+    ''' Prints the latest ticks received for each field '''
+    for (req_id, field), buf in sorted(client.ticks.buffers.items(),
+        key=lambda item: str(item[0])):
+        name = TickTypeEnum.to_str(field) if isinstance(field, int) else field
+        times, prices, sizes = buf.window(5)
+        print('{} - {} ticks, latest prices: {}, sizes: {}'.format(
+            name, len(buf), prices, sizes))
+
+    # Print the bars being built for each interval
+    for (req_id, interval), bar in sorted(client.bars.current.items()):
+        print('{}-second bar for request {}: {}'.format(interval, req_id, bar))
+
+def main():
+
+    # Read the name of a file to record ticks to or replay ticks from
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--record', help='file to append ticks to')
+    parser.add_argument('--replay', help='file of recorded ticks')
+    args = parser.parse_args()
+
+    # Replay recorded ticks without connecting to TWS
+    if args.replay:
+        client = MarketReader(None, None, None)
+        TickReplayer(args.replay).replay(client)
+        print_ticks(client)
+        return
+
+    # Create the client and connect to TWS
+    recorder = TickRecorder(args.record) if args.record else None
+    client = MarketReader('127.0.0.1', 7497, 0, recorder)
+
+    # Request the current time
+    con = Contract()
+    con.symbol = 'IBM'
+    con.secType = 'STK'
+    con.exchange = 'SMART'
+    con.currency = 'USD'
+
+    # Request ten ticks containing midpoint data
+    ticks_done = client.expect(0)
+    client.reqTickByTickData(0, con, 'MidPoint', client.num_ticks, True)
+
+    # Request market data
+    client.reqMktData(1, con, '', False, False, [])
+
+    # Request current bars
+    client.reqRealTimeBars(2, con, 5, 'MIDPOINT', True, [])
+
+    # Request historical bars
+    now = datetime.now().strftime("%Y%m%d, %H:%M:%S")
+    hist_done = client.expect(3)
+    client.reqHistoricalData(3, con, now, '2 w', '1 day',
+        'MIDPOINT', False, 1, False, [])
+
+    # Request fundamental data
+    fund_done = client.request_fundamentals(4, con, 'ReportSnapshot')
+
+    # Wait until the requests are processed
+    wait([ticks_done, hist_done, fund_done], timeout=5)
+
+    # Print the ticks received for each field
+    print_ticks(client)
+    if fund_done.done():
+        print('Fundamental data: {}'.format(fund_done.result()))
+
+    # Disconnect from TWS
+    client.disconnect()
+    if recorder:
+        recorder.close()
+
+if __name__ == '__main__':
     main()
\ No newline at end of file
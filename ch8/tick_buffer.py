@@ -0,0 +1,69 @@
+''' Stores streaming ticks in fixed-capacity NumPy ring buffers '''
+import time
+
+import numpy as np
+
+class TickBuffer:
+    ''' Holds the latest timestamps, prices and sizes of one tick field '''
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.count = 0
+
+        # Every tick is written twice, capacity rows apart, so the latest
+        # n ticks always occupy a contiguous slice
+        self.times = np.zeros(2 * capacity)
+        self.prices = np.zeros(2 * capacity)
+        self.sizes = np.zeros(2 * capacity)
+
+    def append(self, tick_time, price, size=0.0):
+        ''' Stores a tick without allocating memory '''
+        i = self.count % self.capacity
+        j = i + self.capacity
+        self.times[i] = self.times[j] = tick_time
+        self.prices[i] = self.prices[j] = price
+        self.sizes[i] = self.sizes[j] = size
+        self.count += 1
+
+    def window(self, n=None):
+        ''' Returns views of the latest n times, prices and sizes '''
+        count = self.count
+        n = min(count, self.capacity) if n is None else \
+            min(n, count, self.capacity)
+        end = count % self.capacity + self.capacity
+        return (self.times[end-n:end], self.prices[end-n:end],
+            self.sizes[end-n:end])
+
+    def last(self):
+        ''' Returns the latest price, or NaN if no tick was received '''
+        if not self.count:
+            return np.nan
+        return self.prices[(self.count - 1) % self.capacity]
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+class TickStore:
+    ''' Creates and holds a TickBuffer for each request ID and field '''
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.buffers = {}
+
+    def buffer(self, req_id, field):
+        ''' Returns the buffer for a field, creating it if necessary '''
+        key = (req_id, field)
+        buf = self.buffers.get(key)
+        if buf is None:
+            buf = self.buffers[key] = TickBuffer(self.capacity)
+        return buf
+
+    def add(self, req_id, field, price, size=0.0, tick_time=None):
+        ''' Appends a tick, stamping it with the current time if needed '''
+        if tick_time is None:
+            tick_time = time.time()
+        self.buffer(req_id, field).append(tick_time, price, size)
+
+    def window(self, req_id, field, n=None):
+        ''' Returns views of the latest ticks of a field '''
+        return self.buffer(req_id, field).window(n)
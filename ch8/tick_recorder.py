@@ -0,0 +1,155 @@
+''' Records market data callbacks to a file and replays them later '''
+import argparse
+import os
+import time
+
+import numpy as np
+
+from ibapi.common import TickAttrib
+from ibapi.wrapper import EWrapper
+
+# Kinds of recorded events
+TICK_PRICE, TICK_SIZE, MIDPOINT, REALTIME_BAR = range(4)
+
+# Every event occupies one fixed-size record
+RECORD = np.dtype([('recv_time', '<f8'), ('req_id', '<i4'), ('kind', 'u1'),
+    ('attribs', 'u1'), ('field', '<i2'), ('values', '<f8', (8,))])
+
+class TickRecorder:
+    ''' Appends market data events to a binary file of fixed records '''
+
+    def __init__(self, path, batch_size=1024):
+        self.file = open(path, 'ab')
+        self.batch = np.zeros(batch_size, dtype=RECORD)
+        self.num_records = 0
+
+    def tick_price(self, req_id, field, price, attribs):
+        rec = self.next_record(req_id, TICK_PRICE, field)
+        rec['attribs'] = attribs.canAutoExecute | attribs.pastLimit << 1 | \
+            attribs.preOpen << 2
+        rec['values'][0] = price
+
+    def tick_size(self, req_id, field, size):
+        rec = self.next_record(req_id, TICK_SIZE, field)
+        rec['values'][0] = size
+
+    def midpoint(self, req_id, tick_time, midpoint):
+        rec = self.next_record(req_id, MIDPOINT)
+        rec['values'][:2] = (tick_time, midpoint)
+
+    def realtime_bar(self, req_id, bar_time, open, high, low, close, volume,
+        wap, count):
+        rec = self.next_record(req_id, REALTIME_BAR)
+        rec['values'] = (bar_time, open, high, low, close, volume, wap, count)
+
+    def next_record(self, req_id, kind, field=0):
+        ''' Returns the next record of the batch, writing full batches '''
+        if self.num_records == len(self.batch):
+            self.flush()
+        rec = self.batch[self.num_records]
+        rec['recv_time'] = time.time()
+        rec['req_id'] = req_id
+        rec['kind'] = kind
+        rec['attribs'] = 0
+        rec['field'] = field
+        rec['values'] = 0.0
+        self.num_records += 1
+        return rec
+
+    def flush(self):
+        ''' Appends the records of the current batch to the file '''
+        self.file.write(self.batch[:self.num_records].tobytes())
+        self.file.flush()
+        self.num_records = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+class TickReplayer:
+    ''' Memory-maps a recorded file and replays it through EWrapper callbacks '''
+
+    def __init__(self, path):
+        if os.path.getsize(path):
+            self.records = np.memmap(path, dtype=RECORD, mode='r')
+        else:
+            self.records = np.zeros(0, dtype=RECORD)
+
+    def replay(self, wrapper, speed=0.0, chunk_size=65536):
+        ''' Replays at speed times the original rate, or at once if 0 '''
+        start = time.perf_counter()
+        first = self.records['recv_time'][0] if len(self.records) else 0.0
+        for pos in range(0, len(self.records), chunk_size):
+            chunk = self.records[pos:pos + chunk_size]
+
+            # Convert columns to lists once per chunk
+            rows = zip(chunk['recv_time'].tolist(), chunk['req_id'].tolist(),
+                chunk['kind'].tolist(), chunk['attribs'].tolist(),
+                chunk['field'].tolist(), chunk['values'].tolist())
+            for recv_time, req_id, kind, attribs, field, values in rows:
+
+                # Wait until the event is due
+                if speed:
+                    delay = (recv_time - first)/speed - \
+                        (time.perf_counter() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+
+                # Invoke the callback of the recorded event
+                if kind == TICK_PRICE:
+                    attrib = TickAttrib()
+                    attrib.canAutoExecute = bool(attribs & 1)
+                    attrib.pastLimit = bool(attribs & 2)
+                    attrib.preOpen = bool(attribs & 4)
+                    wrapper.tickPrice(req_id, field, values[0], attrib)
+                elif kind == TICK_SIZE:
+                    wrapper.tickSize(req_id, field, int(values[0]))
+                elif kind == MIDPOINT:
+                    wrapper.tickByTickMidPoint(req_id, int(values[0]),
+                        values[1])
+                elif kind == REALTIME_BAR:
+                    wrapper.realtimeBar(req_id, int(values[0]), *values[1:6],
+                        values[6], int(values[7]))
+
+    def __len__(self):
+        return len(self.records)
+
+class CountingWrapper(EWrapper):
+    ''' Counts the callbacks invoked by a replay '''
+
+    def __init__(self):
+        EWrapper.__init__(self)
+        self.num_events = 0
+
+    def tickPrice(self, reqId, field, price, attribs):
+        self.num_events += 1
+
+    def tickSize(self, reqId, field, size):
+        self.num_events += 1
+
+    def tickByTickMidPoint(self, reqId, tick_time, midpoint):
+        self.num_events += 1
+
+    def realtimeBar(self, reqId, time, open, high, low, close, volume,
+        WAP, count):
+        self.num_events += 1
+
+def main():
+
+    # Read the file to replay
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('path', help='file written by TickRecorder')
+    parser.add_argument('--speed', type=float, default=0.0)
+    args = parser.parse_args()
+
+    # Replay the file and measure the event rate
+    replayer = TickReplayer(args.path)
+    wrapper = CountingWrapper()
+    start = time.perf_counter()
+    replayer.replay(wrapper, args.speed)
+    elapsed = time.perf_counter() - start
+    print('Replayed {} events in {:.3f} seconds ({:.0f} per second)'.format(
+        wrapper.num_events, elapsed, wrapper.num_events/max(elapsed, 1e-9)))
+
+if __name__ == '__main__':
+    main()
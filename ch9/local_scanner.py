@@ -0,0 +1,177 @@
+''' Ranks a universe of cached daily bars like the TWS market scanner '''
+import argparse
+import glob
+import os
+import time
+import warnings
+
+import numpy as np
+
+from ibapi.tag_value import TagValue
+
+# Trading days in 13 weeks, and days in the average volume
+WINDOW = 65
+AVG_DAYS = 20
+
+# Bar types whose volume TWS reports as -1
+NO_VOLUME = {'MIDPOINT', 'BID', 'ASK', 'BID_ASK'}
+
+class Universe:
+    ''' Holds the last days of bars of many symbols as 2-D arrays '''
+
+    def __init__(self, symbols, close, high, low, volume, market_caps=None,
+        has_volume=True):
+        self.symbols = np.asarray(symbols)
+        self.has_volume = has_volume
+
+        # One row per symbol, oldest day first, NaN before the first bar
+        self.close = close
+        self.high = high
+        self.low = low
+        self.volume = volume
+
+        # Market capitalization in millions, NaN if unknown
+        caps = market_caps or {}
+        self.market_cap = np.array([caps.get(sym, np.nan)
+            for sym in self.symbols], dtype=float)
+        self.compute()
+
+    def compute(self):
+        ''' Computes the columns that scans and filters compare '''
+
+        # Symbols without bars in part of the window give NaN, not warnings
+        with np.errstate(invalid='ignore', divide='ignore'), \
+            warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            self.last = self.close[:, -1]
+            self.prev = self.close[:, -2]
+            self.today_volume = self.volume[:, -1]
+            self.avg_volume = np.nanmean(self.volume[:, -AVG_DAYS-1:-1],
+                axis=1)
+            self.high_13w = np.nanmax(self.high, axis=1)
+            self.low_13w = np.nanmin(self.low, axis=1)
+
+    @classmethod
+    def load(cls, directory, what='MIDPOINT', window=WINDOW,
+        market_caps=None):
+        ''' Reads the daily bars that BarCache stored in a directory and
+            aligns them on the last window dates of any symbol '''
+        paths = sorted(glob.glob(os.path.join(directory,
+            '*_1_day_{}.npz'.format(what))))
+        symbols = [os.path.basename(path).split('_')[0] for path in paths]
+        series = []
+        for path in paths:
+            with np.load(path) as data:
+                series.append({col: data[col][-window:]
+                    for col in ('time', 'close', 'high', 'low', 'volume')})
+
+        # Each column of the arrays holds one date, NaN where a symbol
+        # has no bar for it
+        dates = np.unique(np.concatenate([np.zeros(0)] +
+            [bars['time'] for bars in series]))[-window:]
+        has_volume = what not in NO_VOLUME
+        if len(dates) == 0:
+            return cls([], market_caps=market_caps, has_volume=has_volume,
+                **{col: np.full((0, window), np.nan)
+                for col in ('close', 'high', 'low', 'volume')})
+        arrays = {col: np.full((len(paths), window), np.nan)
+            for col in ('close', 'high', 'low', 'volume')}
+        offset = window - len(dates)
+        for i, bars in enumerate(series):
+            pos = np.searchsorted(dates, bars['time'])
+            keep = (pos < len(dates)) & \
+                (dates[np.minimum(pos, len(dates) - 1)] == bars['time'])
+            for col, array in arrays.items():
+                array[i, offset + pos[keep]] = bars[col][keep]
+        return cls(symbols, market_caps=market_caps, has_volume=has_volume,
+            **arrays)
+
+def score_hot_by_volume(universe):
+    ''' Today's volume relative to the average daily volume '''
+    return universe.today_volume / universe.avg_volume
+
+def score_high_vs_13w_hl(universe):
+    ''' Position of the last price in its 13-week range, 1 at the high '''
+    return (universe.last - universe.low_13w) / \
+        (universe.high_13w - universe.low_13w)
+
+def score_top_perc_gain(universe):
+    ''' Percentage change since the previous close '''
+    return 100.0 * (universe.last / universe.prev - 1.0)
+
+# Score functions keyed by scan code, higher scores rank first
+SCANS = {'HOT_BY_VOLUME': score_hot_by_volume,
+    'HIGH_VS_13W_HL': score_high_vs_13w_hl,
+    'TOP_PERC_GAIN': score_top_perc_gain}
+
+# Scans and filters that need bars with volume
+VOLUME_SCANS = {'HOT_BY_VOLUME'}
+VOLUME_FILTERS = {'avgVolumeAbove', 'avgVolumeBelow', 'volumeAbove'}
+
+# Filters keyed by scanner tag, each returning a mask of passing symbols
+FILTERS = {'avgVolumeAbove': lambda u, v: u.avg_volume > v,
+    'avgVolumeBelow': lambda u, v: u.avg_volume < v,
+    'marketCapAbove1e6': lambda u, v: u.market_cap > v,
+    'marketCapBelow1e6': lambda u, v: u.market_cap < v,
+    'priceAbove': lambda u, v: u.last > v,
+    'priceBelow': lambda u, v: u.last < v,
+    'volumeAbove': lambda u, v: u.today_volume > v}
+
+def scan(universe, scan_code, filters=(), rows=50):
+    ''' Returns (rank, symbol, score) rows for a scan code and a list of
+        TagValue filters, best first '''
+    if not universe.has_volume:
+        tags = [scan_code] + [tag_value.tag for tag_value in filters]
+        needs = [tag for tag in tags if tag in VOLUME_SCANS | VOLUME_FILTERS]
+        if needs:
+            raise ValueError('Bars without volume cannot serve {}'.format(
+                ', '.join(needs)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = SCANS[scan_code](universe)
+        mask = np.isfinite(scores)
+        for tag_value in filters:
+            mask &= FILTERS[tag_value.tag](universe, float(tag_value.value))
+
+    # Sort only the best rows
+    index = np.flatnonzero(mask)
+    if len(index) > rows:
+        index = index[np.argpartition(-scores[index], rows - 1)[:rows]]
+    index = index[np.argsort(-scores[index], kind='stable')]
+    return [(rank, universe.symbols[i], scores[i])
+        for rank, i in enumerate(index)]
+
+def main():
+
+    # Read the scan code and the directory of cached bars
+    parser = argparse.ArgumentParser()
+    parser.add_argument('directory', nargs='?', default='../ch11/bars')
+    parser.add_argument('--scan-code', default='TOP_PERC_GAIN',
+        choices=sorted(SCANS))
+    parser.add_argument('--what')
+    parser.add_argument('--rows', type=int, default=50)
+    args = parser.parse_args()
+
+    # Volume scans read trades, as midpoint bars have no volume
+    what = args.what or ('TRADES' if args.scan_code in VOLUME_SCANS
+        else 'MIDPOINT')
+
+    # Load the universe
+    start = time.perf_counter()
+    universe = Universe.load(args.directory, what)
+    loaded = time.perf_counter()
+
+    # Apply the filters of stock_scanner.py without the market cap
+    tagvalues = []
+    if universe.has_volume:
+        tagvalues.append(TagValue('avgVolumeAbove', '500000'))
+    results = scan(universe, args.scan_code, tagvalues, args.rows)
+    done = time.perf_counter()
+
+    for rank, symbol, score in results:
+        print('{}: {} ({:.3f})'.format(rank, symbol, score))
+    print('Loaded {} symbols in {:.1f} ms, scanned in {:.2f} ms'.format(
+        len(universe.symbols), 1000 * (loaded - start),
+        1000 * (done - loaded)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+''' Keeps several scanner subscriptions open and reports their changes '''
+from concurrent.futures import Future
+from threading import Lock
+
+# Scanner subscriptions TWS allows at the same time
+MAX_SCANS = 10
+
+class Scan:
+    ''' Holds the latest results of one scanner subscription '''
+
+    def __init__(self, name, req_id, subscription, filters):
+        self.name = name
+        self.req_id = req_id
+        self.subscription = subscription
+        self.filters = filters
+
+        # Ranks and contracts keyed by contract ID
+        self.rows = {}
+        self.incoming = {}
+
+        # Completed with the rows of the first refresh, or None on an error
+        self.first = Future()
+
+class ScannerManager:
+    ''' Runs scans for a client and reports added, removed and moved rows '''
+
+    def __init__(self, client, first_id=5000, max_scans=MAX_SCANS,
+        on_change=None):
+        self.client = client
+        self.next_id = first_id
+        self.max_scans = max_scans
+        self.lock = Lock()
+
+        # Called with (name, added, removed, moved) after each refresh
+        self.on_change = on_change
+
+        # Running scans keyed by request ID, and scans waiting for room
+        self.scans = {}
+        self.waiting = []
+
+    def start(self, name, subscription, filters=None):
+        ''' Starts a scan, or queues it if the scanner limit is reached, and
+            returns it '''
+        with self.lock:
+            scan = Scan(name, self.next_id, subscription, filters or [])
+            self.next_id += 1
+            if len(self.scans) >= self.max_scans:
+                self.waiting.append(scan)
+            else:
+                self.open(scan)
+        return scan
+
+    def stop(self, name):
+        ''' Cancels a scan and starts the next waiting scan '''
+        with self.lock:
+            self.waiting = [scan for scan in self.waiting if scan.name != name]
+            for req_id, scan in list(self.scans.items()):
+                if scan.name == name:
+                    del self.scans[req_id]
+                    self.client.cancelScannerSubscription(req_id)
+            self.fill()
+
+    def stop_all(self):
+        ''' Cancels every scan '''
+        with self.lock:
+            self.waiting.clear()
+            for req_id in list(self.scans):
+                del self.scans[req_id]
+                self.client.cancelScannerSubscription(req_id)
+
+    def open(self, scan):
+        self.scans[scan.req_id] = scan
+        self.client.reqScannerSubscription(scan.req_id, scan.subscription,
+            [], scan.filters)
+
+    def fill(self):
+        ''' Starts waiting scans while the scanner limit allows '''
+        while self.waiting and len(self.scans) < self.max_scans:
+            self.open(self.waiting.pop(0))
+
+    def on_error(self, req_id):
+        ''' Frees the slot of a scan that failed, called from error '''
+        with self.lock:
+            scan = self.scans.pop(req_id, None)
+            if scan is None:
+                return
+            self.fill()
+        if not scan.first.done():
+            scan.first.set_result(None)
+
+    def on_row(self, req_id, rank, details):
+        ''' Collects a row of a refresh, called from scannerData '''
+        scan = self.scans.get(req_id)
+        if scan is not None:
+            con = details.contract
+            scan.incoming[con.conId or con.symbol] = (rank, con)
+
+    def on_end(self, req_id):
+        ''' Compares a finished refresh with the previous one '''
+        with self.lock:
+            scan = self.scans.get(req_id)
+            if scan is None:
+                return None
+            old, new = scan.rows, scan.incoming
+            scan.rows, scan.incoming = new, {}
+        if not scan.first.done():
+            scan.first.set_result(sorted(new.values(), key=lambda row: row[0]))
+
+        # Only rows that changed are reported
+        added = [new[key] for key in new if key not in old]
+        removed = [old[key][1] for key in old if key not in new]
+        moved = [(old[key][0], new[key][0], new[key][1]) for key in new
+            if key in old and old[key][0] != new[key][0]]
+        if self.on_change and (added or removed or moved):
+            self.on_change(scan.name, added, removed, moved)
+        return added, removed, moved
+
+    def results(self, name):
+        ''' Returns the latest (rank, contract) rows of a scan by rank '''
+        with self.lock:
+            for scan in self.scans.values():
+                if scan.name == name:
+                    return sorted(scan.rows.values(), key=lambda row: row[0])
+        return []
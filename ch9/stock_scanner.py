@@ -1,67 +1,109 @@
-''' Demonstrates how an application can scan for securities '''
-
-from threading import Thread
-import time
-
-from ibapi.client import EClient, Contract
-from ibapi.wrapper import EWrapper
-from ibapi.utils import iswrapper
-from ibapi.scanner import ScannerSubscription
-from ibapi.tag_value import TagValue
-
-class StockScanner(EWrapper, EClient):
-    ''' Serves as the client and the wrapper '''
-
-    def __init__(self, addr, port, client_id):
-        EClient. __init__(self, self)
-
-        # Connect to TWS
-        self.connect(addr, port, client_id)
-        self.count = 0
-
-        # Launch the client thread
-        thread = Thread(target=self.run)
-        thread.start()
-
-    @iswrapper
-    def scannerData(self, reqId, rank, details, distance, benchmark, projection, legsStr):
-
-        # Print the symbols in the returned results
-        print('{}: {}'.format(rank, details.contract.symbol))
-        self.count += 1
-        
-    @iswrapper
-    def scannerDataEnd(self, reqId):
-    
-        # Print the number of results
-        print('Number of results: {}'.format(self.count))
-    
-    def error(self, reqId, code, msg):
-        print('Error {}: {}'.format(code, msg))
-        
-def main():
-
-    # Create the client and connect to TWS
-    client = StockScanner('127.0.0.1', 7497, 0)
-    time.sleep(0.5)
-
-    # Create the ScannerSubscription object    
-    ss = ScannerSubscription()
-    ss.instrument = 'STK'
-    ss.locationCode = 'STK.US.MAJOR'
-    ss.scanCode = 'HOT_BY_VOLUME'
-
-    # Set additional filter criteria
-    tagvalues = []
-    tagvalues.append(TagValue('avgVolumeAbove', '500000'))
-    tagvalues.append(TagValue('marketCapAbove1e6', '10'))
-
-    # Requet the scanner subscription
-    client.reqScannerSubscription(0, ss, [], tagvalues)
-    
-     # Sleep while the request is processed
-    time.sleep(5)       
-    client.disconnect()
-
-if __name__ == '__main__':
-    main()
+''' Demonstrates how an application can scan for securities '''
+
+from concurrent.futures import wait
+from threading import Thread
+import os
+import sys
+
+from ibapi.client import EClient, Contract
+from ibapi.wrapper import EWrapper
+from ibapi.utils import iswrapper
+from ibapi.scanner import ScannerSubscription
+from ibapi.tag_value import TagValue
+
+# The shared modules live in the common directory next to the chapters
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pending import RequestTracker, WARNING_CODES
+
+from scanner_manager import ScannerManager
+
+class StockScanner(RequestTracker, EWrapper, EClient):
+    ''' Serves as the client and the wrapper '''
+
+    def __init__(self, addr, port, client_id):
+        EClient. __init__(self, self)
+
+        # Futures for pending requests, keyed by request ID
+        RequestTracker.__init__(self)
+        self.connected = self.expect('nextValidId')
+
+        # Connect to TWS
+        self.connect(addr, port, client_id)
+
+        # Scans that stay open and report only their changes
+        self.scanner = ScannerManager(self, on_change=self.print_changes)
+
+        # Launch the client thread
+        thread = Thread(target=self.run)
+        thread.start()
+
+    @iswrapper
+    def nextValidId(self, order_id):
+        ''' Called once the connection to TWS is ready '''
+        self.resolve('nextValidId', order_id)
+
+    @iswrapper
+    def scannerData(self, reqId, rank, details, distance, benchmark, projection, legsStr):
+
+        # Collect the rows of the refresh
+        self.scanner.on_row(reqId, rank, details)
+
+    @iswrapper
+    def scannerDataEnd(self, reqId):
+
+        # Report the rows that changed since the last refresh
+        self.scanner.on_end(reqId)
+
+    @iswrapper
+    def error(self, req_id, code, msg):
+        ''' Called if an error occurs, a failed scan frees its slot '''
+        RequestTracker.error(self, req_id, code, msg)
+        if code not in WARNING_CODES:
+            self.scanner.on_error(req_id)
+
+    def print_changes(self, name, added, removed, moved):
+        ''' Prints the rows a refresh added, removed or moved '''
+        for rank, con in sorted(added, key=lambda row: row[0]):
+            print('{} added {}: {}'.format(name, rank, con.symbol))
+        for con in removed:
+            print('{} removed: {}'.format(name, con.symbol))
+        for old_rank, rank, con in moved:
+            print('{} moved {} -> {}: {}'.format(name, old_rank, rank,
+                con.symbol))
+
+def main():
+
+    # Create the client and connect to TWS
+    client = StockScanner('127.0.0.1', 7497, 0)
+    wait([client.connected], timeout=5)
+
+    # Set additional filter criteria
+    tagvalues = []
+    tagvalues.append(TagValue('avgVolumeAbove', '500000'))
+    tagvalues.append(TagValue('marketCapAbove1e6', '10'))
+
+    # Start a scan for each scan code
+    refreshes = []
+    for scan_code in ['HOT_BY_VOLUME', 'TOP_PERC_GAIN']:
+
+        # Create the ScannerSubscription object
+        ss = ScannerSubscription()
+        ss.instrument = 'STK'
+        ss.locationCode = 'STK.US.MAJOR'
+        ss.scanCode = scan_code
+
+        # Request the scanner subscription, its future exists before
+        # the request is sent
+        scan = client.scanner.start(scan_code, ss, tagvalues)
+        refreshes.append(scan.first)
+
+    # Wait until the first results of every scan are processed
+    wait(refreshes, timeout=5)
+    for scan_code in ['HOT_BY_VOLUME', 'TOP_PERC_GAIN']:
+        print('{}: {} results'.format(scan_code,
+            len(client.scanner.results(scan_code))))
+    client.scanner.stop_all()
+    client.disconnect()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+''' Modules shared by the clients of several chapters
+
+The scripts of each chapter add the directory above their own to sys.path
+and import these modules as common.<name>. '''
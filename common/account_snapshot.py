@@ -0,0 +1,89 @@
+''' Keeps positions and account values current from TWS subscriptions '''
+from threading import Event, Lock
+import time
+
+class AccountSnapshot:
+    ''' Stores the latest positions and account tags for reading on demand '''
+
+    def __init__(self):
+        self.lock = Lock()
+
+        # Positions keyed by (account, conId), values by tag and account
+        self.positions = {}
+        self.values = {}
+
+        # Set once the initial rows of each subscription have arrived
+        self.positions_ready = Event()
+        self.values_ready = Event()
+
+    # Updates
+
+    def on_position(self, account, contract, pos, avg_cost):
+        ''' Applies a position callback '''
+        with self.lock:
+            key = (account, contract.conId)
+            if pos:
+                self.positions[key] = (contract, pos, avg_cost)
+            else:
+                self.positions.pop(key, None)
+
+    def on_position_end(self):
+        self.positions_ready.set()
+
+    def on_account_summary(self, account, tag, value, currency):
+        ''' Applies an accountSummary callback '''
+        with self.lock:
+            self.values.setdefault(tag, {})[account] = (value, currency)
+
+    def on_account_summary_end(self):
+        self.values_ready.set()
+
+    def on_portfolio(self, contract, pos, avg_cost, account):
+        ''' Applies an updatePortfolio callback '''
+        self.on_position(account, contract, pos, avg_cost)
+
+    def on_account_value(self, tag, value, currency, account):
+        ''' Applies an updateAccountValue callback '''
+        self.on_account_summary(account, tag, value, currency)
+
+    def on_account_download_end(self, account):
+        ''' Called once reqAccountUpdates has sent positions and values '''
+        self.positions_ready.set()
+        self.values_ready.set()
+
+    # Queries
+
+    def wait_ready(self, timeout=None):
+        ''' Waits for the initial positions and account values '''
+        if timeout is None:
+            return self.positions_ready.wait() and self.values_ready.wait()
+        deadline = time.monotonic() + timeout
+        return self.positions_ready.wait(timeout) and \
+            self.values_ready.wait(max(deadline - time.monotonic(), 0.0))
+
+    def position(self, symbol, account=None):
+        ''' Returns the total position in a symbol '''
+        with self.lock:
+            return sum(pos for (acct, _), (con, pos, _) in
+                self.positions.items() if con.symbol == symbol and
+                account in (None, acct))
+
+    def value(self, tag, account=None, default=None):
+        ''' Returns an account value as a float if possible '''
+        with self.lock:
+            accounts = self.values.get(tag, {})
+            if account is None:
+                account = next(iter(accounts), None)
+            if account not in accounts:
+                return default
+            value = accounts[account][0]
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+    def snapshot(self):
+        ''' Returns copies of the positions and values taken together '''
+        with self.lock:
+            return dict(self.positions), \
+                {tag: dict(accounts) for tag, accounts in self.values.items()}
@@ -0,0 +1,134 @@
+''' Caches contract details on disk with a time-to-live '''
+from collections import OrderedDict
+from concurrent.futures import wait
+from threading import Lock
+import pickle
+import sqlite3
+import time
+
+def cache_key(contract):
+    ''' Identifies a contract request by the fields that select it '''
+    return '|'.join(str(field) for field in (contract.conId,
+        contract.symbol, contract.secType, contract.exchange,
+        contract.primaryExchange, contract.currency, contract.localSymbol,
+        contract.tradingClass, contract.lastTradeDateOrContractMonth,
+        contract.strike, contract.right, contract.multiplier,
+        contract.includeExpired))
+
+class ContractCache:
+    ''' Stores ContractDetails lists in SQLite behind an in-memory LRU '''
+
+    def __init__(self, path='contracts.db', ttl=86400.0, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lru = OrderedDict()
+        self.lock = Lock()
+
+        # Open the database, which may be shared by several runs
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS contract_details '
+            '(key TEXT PRIMARY KEY, fetched REAL, details BLOB)')
+        self.db.commit()
+
+    def get(self, contract):
+        ''' Returns the cached details or None if missing or expired '''
+        key = cache_key(contract)
+        now = time.time()
+        with self.lock:
+
+            # Check the in-memory entries first
+            if key in self.lru:
+                fetched, details = self.lru[key]
+                if now - fetched < self.ttl:
+                    self.lru.move_to_end(key)
+                    return details
+                del self.lru[key]
+
+            # Fall back to the database
+            row = self.db.execute('SELECT fetched, details FROM '
+                'contract_details WHERE key = ?', (key,)).fetchone()
+            if row is None or now - row[0] >= self.ttl:
+                return None
+            details = pickle.loads(row[1])
+            self.remember(key, row[0], details)
+            return details
+
+    def put(self, contract, details):
+        ''' Stores the details received for a contract request '''
+        key = cache_key(contract)
+        now = time.time()
+        with self.lock:
+            self.remember(key, now, details)
+            self.db.execute('INSERT OR REPLACE INTO contract_details '
+                'VALUES (?, ?, ?)', (key, now, pickle.dumps(details)))
+            self.db.commit()
+
+    def invalidate(self, contract=None):
+        ''' Removes one contract, or every contract if none is given '''
+        with self.lock:
+            if contract is None:
+                self.lru.clear()
+                self.db.execute('DELETE FROM contract_details')
+            else:
+                key = cache_key(contract)
+                self.lru.pop(key, None)
+                self.db.execute('DELETE FROM contract_details WHERE key = ?',
+                    (key,))
+            self.db.commit()
+
+    def purge(self):
+        ''' Deletes expired rows from the database '''
+        with self.lock:
+            self.db.execute('DELETE FROM contract_details WHERE fetched < ?',
+                (time.time() - self.ttl,))
+            self.db.commit()
+
+    def remember(self, key, fetched, details):
+        ''' Adds an entry to the LRU, evicting the oldest if full '''
+        self.lru[key] = (fetched, details)
+        self.lru.move_to_end(key)
+        if len(self.lru) > self.max_entries:
+            self.lru.popitem(last=False)
+
+    def close(self):
+        self.db.close()
+
+class DetailsLookup:
+    ''' Answers contract details requests from a ContractCache if possible
+
+    A client lists it after RequestTracker and before EWrapper among its
+    bases. Its callbacks collect the details of each request and store
+    them in the cache. '''
+
+    def __init__(self, cache=None):
+
+        # Cached details and the requests waiting to fill the cache
+        self.cache = cache
+        self.contracts = {}
+        self.details = {}
+
+    def contractDetails(self, reqId, details):
+        ''' Called in response to reqContractDetails '''
+        self.details.setdefault(reqId, []).append(details)
+
+    def contractDetailsEnd(self, reqId):
+        ''' Called after the contract details have been received '''
+        details = self.details.pop(reqId, [])
+        contract = self.contracts.pop(reqId, None)
+        if self.cache is not None and contract is not None:
+            self.cache.put(contract, details)
+        self.resolve(reqId, details)
+
+    def get_details(self, req_id, contract, timeout=3):
+        ''' Returns cached details or requests them from TWS '''
+        if self.cache is not None:
+            details = self.cache.get(contract)
+            if details is not None:
+                return details
+
+        # Request the details and wait for contractDetailsEnd
+        done = self.expect(req_id)
+        self.contracts[req_id] = contract
+        self.reqContractDetails(req_id, contract)
+        wait([done], timeout=timeout)
+        return (done.done() and done.result()) or []
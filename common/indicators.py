@@ -0,0 +1,488 @@
+''' Streaming indicators that update in constant time with each bar
+
+Each indicator's update(bar) takes an object with open, high, low, close
+and volume attributes, such as BarData, and returns the latest value, or
+None until enough bars have been seen. Indicators of one series also
+provide add(value) for plain numbers.
+
+The lowercase functions compute the same indicators over whole arrays,
+with time along the first axis and, optionally, symbols along the second.
+Their results are NaN where the streaming versions return None. Recursive
+and cumulative indicators match the streaming versions exactly, windowed
+ones to rounding error.
+'''
+from collections import deque
+import math
+
+import numpy as np
+
+class RollingSum:
+    ''' Sum of the last period values over a ring buffer '''
+
+    def __init__(self, period, field='close'):
+        self.period = period
+        self.field = field
+        self.window = [0.0] * period
+        self.pos = 0
+        self.count = 0
+
+        # Running sum with Kahan compensation for the rounding error
+        self.sum = 0.0
+        self.comp = 0.0
+        self.value = None
+
+    def update(self, bar):
+        return self.add(getattr(bar, self.field))
+
+    def add(self, x):
+        old = self.window[self.pos]
+        self.window[self.pos] = x
+        self.pos = (self.pos + 1) % self.period
+        if self.count < self.period:
+            self.count += 1
+            old = 0.0
+
+        # Add the change in the sum, carrying the lost low-order bits
+        y = (x - old) - self.comp
+        total = self.sum + y
+        self.comp = (total - self.sum) - y
+        self.sum = total
+        if self.count == self.period:
+            self.value = self.sum
+        return self.value
+
+class SMA(RollingSum):
+    ''' Simple moving average over a ring buffer '''
+
+    def add(self, x):
+        if RollingSum.add(self, x) is not None:
+            self.value = self.sum / self.period
+        return self.value
+
+class EMA:
+    ''' Exponential moving average, seeded with the SMA of the first
+        period values '''
+
+    def __init__(self, period, field='close', alpha=None):
+        self.period = period
+        self.field = field
+        self.alpha = alpha if alpha is not None else 2.0 / (period + 1)
+        self.count = 0
+        self.seed = 0.0
+        self.value = None
+
+    def update(self, bar):
+        return self.add(getattr(bar, self.field))
+
+    def add(self, x):
+        if self.value is not None:
+            self.value += self.alpha * (x - self.value)
+        else:
+            self.seed += x
+            self.count += 1
+            if self.count == self.period:
+                self.value = self.seed / self.period
+        return self.value
+
+class SMMA(EMA):
+    ''' Wilder's smoothed moving average, an EMA with alpha = 1/period '''
+
+    def __init__(self, period, field='close'):
+        EMA.__init__(self, period, field, 1.0 / period)
+
+class RollingStd:
+    ''' Standard deviation over a window, updated with Welford's method '''
+
+    def __init__(self, period, field='close', ddof=0):
+        self.period = period
+        self.field = field
+        self.ddof = ddof
+        self.window = [0.0] * period
+        self.pos = 0
+        self.count = 0
+
+        # Mean and sum of squared deviations of the window
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.value = None
+
+    def update(self, bar):
+        return self.add(getattr(bar, self.field))
+
+    def add(self, x):
+        old = self.window[self.pos]
+        self.window[self.pos] = x
+        self.pos = (self.pos + 1) % self.period
+        if self.count < self.period:
+
+            # Grow the window by one value
+            self.count += 1
+            delta = x - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (x - self.mean)
+        else:
+
+            # Replace the oldest value with the newest
+            old_mean = self.mean
+            self.mean += (x - old) / self.period
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        if self.count == self.period:
+            self.value = math.sqrt(max(self.m2, 0.0) /
+                (self.period - self.ddof))
+        return self.value
+
+class RollingMax:
+    ''' Highest of the last period values, from a monotonic deque '''
+
+    def __init__(self, period, field='close'):
+        self.period = period
+        self.field = field
+
+        # Positions and values that can still become the highest
+        self.window = deque()
+        self.count = 0
+        self.value = None
+
+    def update(self, bar):
+        return self.add(getattr(bar, self.field))
+
+    def better(self, x, y):
+        return x >= y
+
+    def add(self, x):
+        while self.window and self.better(x, self.window[-1][1]):
+            self.window.pop()
+        self.window.append((self.count, x))
+        if self.window[0][0] <= self.count - self.period:
+            self.window.popleft()
+        self.count += 1
+        if self.count >= self.period:
+            self.value = self.window[0][1]
+        return self.value
+
+class RollingMin(RollingMax):
+    ''' Lowest of the last period values '''
+
+    def better(self, x, y):
+        return x <= y
+
+class Bollinger:
+    ''' Returns (average, upper band, lower band) '''
+
+    def __init__(self, period=20, width=2.0, field='close'):
+        self.std = RollingStd(period, field)
+        self.width = width
+        self.value = None
+
+    def update(self, bar):
+        return self.add(getattr(bar, self.std.field))
+
+    def add(self, x):
+        sigma = self.std.add(x)
+        if sigma is not None:
+            avg = self.std.mean
+            self.value = (avg, avg + self.width * sigma,
+                avg - self.width * sigma)
+        return self.value
+
+class TrueRange:
+    ''' Largest of the bar's range and its distance from the last close '''
+
+    def __init__(self):
+        self.prev_close = None
+        self.value = None
+
+    def update(self, bar):
+        return self.add(bar.high, bar.low, bar.close)
+
+    def add(self, high, low, close):
+        if self.prev_close is not None:
+            self.value = max(high - low, abs(high - self.prev_close),
+                abs(low - self.prev_close))
+        self.prev_close = close
+        return self.value
+
+class ATR:
+    ''' Average true range, the Wilder average of the true range '''
+
+    def __init__(self, period=14):
+        self.true_range = TrueRange()
+        self.average = SMMA(period)
+        self.value = None
+
+    def update(self, bar):
+        true_range = self.true_range.update(bar)
+        if true_range is not None:
+            self.value = self.average.add(true_range)
+        return self.value
+
+class RSI:
+    ''' Relative strength index from Wilder averages of gains and losses '''
+
+    def __init__(self, period=14, field='close'):
+        self.field = field
+        self.gains = SMMA(period)
+        self.losses = SMMA(period)
+        self.prev = None
+        self.value = None
+
+    def update(self, bar):
+        return self.add(getattr(bar, self.field))
+
+    def add(self, x):
+        if self.prev is not None:
+            change = x - self.prev
+            gain = self.gains.add(max(change, 0.0))
+            loss = self.losses.add(max(-change, 0.0))
+            if gain is not None:
+                self.value = rsi_value(gain, loss)
+        self.prev = x
+        return self.value
+
+def rsi_value(gain, loss):
+    ''' RSI from an average gain and an average loss '''
+    return 100.0 if loss == 0.0 else 100.0 - 100.0 / (1.0 + gain / loss)
+
+class OBV:
+    ''' On-balance volume, adding volume on up bars and subtracting it on
+        down bars '''
+
+    def __init__(self):
+        self.prev_close = None
+        self.value = None
+
+    def update(self, bar):
+        if self.prev_close is None:
+            self.value = 0.0
+        elif bar.close > self.prev_close:
+            self.value += bar.volume
+        elif bar.close < self.prev_close:
+            self.value -= bar.volume
+        self.prev_close = bar.close
+        return self.value
+
+class AccDist:
+    ''' Accumulation/distribution line, the running sum of volume weighted
+        by the close location value '''
+
+    def __init__(self):
+        self.value = 0.0
+
+    def update(self, bar):
+        spread = bar.high - bar.low
+        if spread > 0.0:
+            self.value += ((bar.close - bar.low) - (bar.high - bar.close)) / \
+                spread * bar.volume
+        return self.value
+
+class MACD:
+    ''' Returns (MACD, signal line, histogram) '''
+
+    def __init__(self, fast=12, slow=26, signal=9, field='close'):
+        self.field = field
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+        self.value = None
+
+    def update(self, bar):
+        return self.add(getattr(bar, self.field))
+
+    def add(self, x):
+        fast = self.fast.add(x)
+        slow = self.slow.add(x)
+        if slow is not None:
+            macd = fast - slow
+            signal = self.signal.add(macd)
+            if signal is not None:
+                self.value = (macd, signal, macd - signal)
+        return self.value
+
+class TSI:
+    ''' True strength index, the ratio of double-smoothed momentum to
+        double-smoothed absolute momentum '''
+
+    def __init__(self, slow=25, fast=13, field='close'):
+        self.field = field
+        self.num_slow = EMA(slow)
+        self.num_fast = EMA(fast)
+        self.den_slow = EMA(slow)
+        self.den_fast = EMA(fast)
+        self.prev = None
+        self.value = None
+
+    def update(self, bar):
+        return self.add(getattr(bar, self.field))
+
+    def add(self, x):
+        if self.prev is not None:
+            m = x - self.prev
+            num = self.num_slow.add(m)
+            den = self.den_slow.add(abs(m))
+            if num is not None:
+                num = self.num_fast.add(num)
+                den = self.den_fast.add(den)
+                if num is not None:
+                    self.value = tsi_value(num, den)
+        self.prev = x
+        return self.value
+
+def tsi_value(num, den):
+    ''' TSI from smoothed momentum and smoothed absolute momentum '''
+    return 100.0 * num / den if den else 0.0
+
+def leading(x, period, start=0):
+    ''' Returns an array of NaN shaped like x with its first valid index '''
+    return np.full(np.shape(x), np.nan), start + period - 1
+
+def recurse(x, alpha, period, start=0, init=None):
+    ''' Applies the EMA recursion of the streaming classes from index start,
+        so the results match them bit for bit. Given init, the previous
+        values, the recursion continues from them instead of seeding '''
+    x = np.asarray(x, dtype=float)
+    out, first = leading(x, period, start)
+    if init is not None:
+        first = start
+    if len(x) <= first:
+        return out
+
+    # Seed with the mean of the first period values, added in order
+    if init is None:
+        out[first] = np.cumsum(x[start:first+1], axis=0)[-1] / period
+    else:
+        out[first] = init + alpha * (x[first] - init)
+    if x.ndim == 1:
+
+        # Loop over Python floats, which is faster than indexing arrays
+        values = x.tolist()
+        value = out[first].item()
+        result = [value]
+        for i in range(first + 1, len(values)):
+            value += alpha * (values[i] - value)
+            result.append(value)
+        out[first:] = result
+    else:
+
+        # Update every symbol at once, one row at a time
+        for i in range(first + 1, len(x)):
+            out[i] = out[i-1] + alpha * (x[i] - out[i-1])
+    return out
+
+def sma(x, period, start=0):
+    ''' Simple moving average from windowed sums of a cumulative sum '''
+    x = np.asarray(x, dtype=float)
+    out, first = leading(x, period, start)
+    if len(x) <= first:
+        return out
+
+    # Subtract the first value to limit the growth of the cumulative sum
+    base = x[start]
+    sums = np.cumsum(x[start:] - base, axis=0)
+    out[first] = sums[period-1]
+    out[first+1:] = sums[period:] - sums[:-period]
+    out[first:] = out[first:] / period + base
+    return out
+
+def ema(x, period, alpha=None, start=0, init=None):
+    return recurse(x, alpha if alpha is not None else 2.0 / (period + 1),
+        period, start, init)
+
+def smma(x, period, start=0, init=None):
+    return recurse(x, 1.0 / period, period, start, init)
+
+def rolling_std(x, period, ddof=0, start=0):
+    ''' Standard deviation of each window of period values '''
+    x = np.asarray(x, dtype=float)
+    out, first = leading(x, period, start)
+    if len(x) <= first:
+        return out
+    windows = np.lib.stride_tricks.sliding_window_view(x[start:], period,
+        axis=0)
+
+    # Limit the deviations held in memory to about a million values
+    step = max(1, 2**20 // (period * max(1, x[0].size)))
+    for i in range(0, len(windows), step):
+        out[first+i:first+i+step] = np.std(windows[i:i+step], axis=-1,
+            ddof=ddof)
+    return out
+
+def bollinger(x, period=20, width=2.0):
+    ''' Returns the average, upper band and lower band '''
+    avg = sma(x, period)
+    sigma = rolling_std(x, period)
+    return avg, avg + width * sigma, avg - width * sigma
+
+def true_range(high, low, close):
+    high, low, close = (np.asarray(a, dtype=float) for a in (high, low, close))
+    out = np.full(close.shape, np.nan)
+    out[1:] = range_from(high[1:], low[1:], close[:-1])
+    return out
+
+def range_from(high, low, prev_close):
+    ''' True range of bars given the close before each '''
+    return np.maximum(high - low, np.maximum(np.abs(high - prev_close),
+        np.abs(low - prev_close)))
+
+def atr(high, low, close, period=14):
+    return smma(true_range(high, low, close), period, start=1)
+
+def rsi(close, period=14):
+    close = np.asarray(close, dtype=float)
+    change = np.full(close.shape, np.nan)
+    change[1:] = close[1:] - close[:-1]
+    gain = smma(np.maximum(change, 0.0), period, start=1)
+    loss = smma(np.maximum(-change, 0.0), period, start=1)
+    return rsi_from(gain, loss)
+
+def rsi_from(gain, loss):
+    ''' RSI from the average gain and the average loss '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(loss == 0.0, 100.0,
+            100.0 - 100.0 / (1.0 + gain / loss))
+
+def obv(close, volume):
+    ''' Running sum of volume signed by the direction of the close '''
+    close, volume = np.asarray(close, dtype=float), np.asarray(volume,
+        dtype=float)
+    flow = np.zeros(close.shape)
+    flow[1:] = obv_flow(close[1:], close[:-1], volume[1:])
+    return np.cumsum(flow, axis=0)
+
+def obv_flow(close, prev_close, volume):
+    ''' Volume signed by the direction of each close '''
+    return np.where(close > prev_close, volume,
+        np.where(close < prev_close, -volume, 0.0))
+
+def acc_dist(high, low, close, volume):
+    ''' Running sum of volume weighted by the close location value '''
+    high, low, close, volume = (np.asarray(a, dtype=float)
+        for a in (high, low, close, volume))
+    return np.cumsum(clv_flow(high, low, close, volume), axis=0)
+
+def clv_flow(high, low, close, volume):
+    ''' Volume weighted by the close location value of each bar '''
+    spread = high - low
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(spread > 0.0, ((close - low) - (high - close)) /
+            spread * volume, 0.0)
+
+def macd(x, fast=12, slow=26, signal=9):
+    ''' Returns the MACD, signal line and histogram '''
+    line = ema(x, fast) - ema(x, slow)
+    signal_line = ema(line, signal, start=slow-1)
+    line = np.where(np.isnan(signal_line), np.nan, line)
+    return line, signal_line, line - signal_line
+
+def tsi(x, slow=25, fast=13):
+    x = np.asarray(x, dtype=float)
+    m = np.full(x.shape, np.nan)
+    m[1:] = x[1:] - x[:-1]
+    num = ema(ema(m, slow, start=1), fast, start=slow)
+    den = ema(ema(np.abs(m), slow, start=1), fast, start=slow)
+    return tsi_from(num, den)
+
+def tsi_from(num, den):
+    ''' TSI from the smoothed momentum and smoothed absolute momentum '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den != 0.0, 100.0 * num / den,
+            np.where(np.isnan(den), np.nan, 0.0))
@@ -0,0 +1,141 @@
+''' Submits bracket and OCA groups in one burst and times each leg '''
+from collections import OrderedDict
+from threading import Event, Lock
+import time
+
+from ibapi import comm
+from ibapi.client import EClient
+
+# Statuses after which TWS sends nothing more for an order
+DONE_STATUSES = {'Filled', 'Cancelled', 'ApiCancelled', 'Inactive'}
+
+class Encoder(EClient):
+    ''' Encodes requests for a connected client without sending them '''
+
+    def __init__(self, client):
+        EClient.__init__(self, client.wrapper)
+        self.serverVersion_ = client.serverVersion()
+        self.messages = []
+
+    def isConnected(self):
+        return True
+
+    def sendMsg(self, msg):
+        self.messages.append(comm.make_msg(msg))
+
+class Leg:
+    ''' Holds one order of a group and the times it was sent and acked '''
+
+    def __init__(self, order):
+        self.order = order
+        self.sent = None
+        self.acked = None
+        self.status = ''
+
+    def latency(self):
+        ''' Returns the seconds from sending to the first status, or None '''
+        if self.sent is None or self.acked is None:
+            return None
+        return self.acked - self.sent
+
+class GroupHandle:
+    ''' Tracks the legs of a submitted group, keyed by order ID '''
+
+    def __init__(self, orders):
+        self.legs = OrderedDict((order.orderId, Leg(order))
+            for order in orders)
+        self.remaining = len(self.legs)
+        self.acked = Event()
+
+    def on_status(self, order_id, status):
+        leg = self.legs[order_id]
+        leg.status = status
+        if leg.acked is None:
+            leg.acked = time.perf_counter()
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.acked.set()
+
+    def wait(self, timeout=None):
+        ''' Waits until every leg is acknowledged, returns False on timeout '''
+        return self.acked.wait(timeout)
+
+    def latencies(self):
+        ''' Returns the acknowledgement latency of each leg in seconds '''
+        return OrderedDict((order_id, leg.latency())
+            for order_id, leg in self.legs.items())
+
+class OrderGroups:
+    ''' Assigns IDs to groups of orders and pipelines their submission '''
+
+    def __init__(self, client, store=None):
+        self.client = client
+        self.lock = Lock()
+
+        # OrderStore that records each leg as it is placed, if any
+        self.store = store
+
+        # Handles of submitted groups, keyed by the order ID of each leg
+        self.handles = {}
+
+    def bracket(self, contract, parent, *children):
+        ''' Submits a parent order and children that wait for it to fill '''
+        order_id = self.client.reserve_ids(1 + len(children))
+        parent.orderId = order_id
+        for i, child in enumerate(children):
+            child.orderId = order_id + 1 + i
+            child.parentId = order_id
+
+        # Hold every leg until the last one transmits the group
+        legs = [parent] + list(children)
+        for leg in legs:
+            leg.transmit = False
+        legs[-1].transmit = True
+        return self.submit(contract, legs)
+
+    def oca(self, contract, orders, group, oca_type=1):
+        ''' Submits orders that cancel or reduce each other as they fill '''
+        order_id = self.client.reserve_ids(len(orders))
+        for i, order in enumerate(orders):
+            order.orderId = order_id + i
+            order.ocaGroup = group
+            order.ocaType = oca_type
+            order.transmit = True
+        return self.submit(contract, orders)
+
+    def submit(self, contract, orders):
+        ''' Sends orders with assigned IDs and returns their handle '''
+        handle = GroupHandle(orders)
+        with self.lock:
+            for order_id in handle.legs:
+                self.handles[order_id] = handle
+        if self.store is not None:
+            for order in orders:
+                self.store.on_place(order.orderId, contract, order)
+
+        # Encode every placeOrder message, then write them together
+        if not self.client.isConnected():
+            for order in orders:
+                self.client.placeOrder(order.orderId, contract, order)
+            return handle
+        encoder = Encoder(self.client)
+        for order in orders:
+            encoder.placeOrder(order.orderId, contract, order)
+        conn = self.client.conn
+        with conn.lock:
+            sent = time.perf_counter()
+            for leg in handle.legs.values():
+                leg.sent = sent
+            conn.socket.sendall(b''.join(encoder.messages))
+        return handle
+
+    def on_status(self, order_id, status):
+        ''' Records a status of a leg, called from orderStatus '''
+        with self.lock:
+            handle = self.handles.get(order_id)
+            if handle is not None:
+                handle.on_status(order_id, status)
+
+                # Forget legs that will not change again
+                if status in DONE_STATUSES:
+                    del self.handles[order_id]
@@ -0,0 +1,29 @@
+''' Reserves order IDs locally after TWS provides the first '''
+from threading import Lock
+
+class OrderIds:
+    ''' Hands out blocks of consecutive order IDs to the threads of a client
+
+    A client lists it after RequestTracker and before EWrapper among its
+    bases. Its nextValidId seeds the counter and completes the
+    'nextValidId' request. '''
+
+    def __init__(self):
+
+        # Next unused ID, None until TWS provides one
+        self.next_id = None
+        self.id_lock = Lock()
+
+    def nextValidId(self, order_id):
+        ''' Provides the next order ID '''
+        with self.id_lock:
+            if self.next_id is None or order_id > self.next_id:
+                self.next_id = order_id
+        self.resolve('nextValidId', order_id)
+
+    def reserve_ids(self, count=1):
+        ''' Reserves a block of consecutive order IDs, returning the first '''
+        with self.id_lock:
+            first = self.next_id
+            self.next_id += count
+        return first
@@ -0,0 +1,194 @@
+''' Keeps the state of submitted orders up to date from TWS callbacks '''
+from threading import Lock
+
+# Statuses of orders that may still be filled
+ACTIVE_STATUSES = {'ApiPending', 'PendingSubmit', 'PreSubmitted', 'Submitted',
+    'PendingCancel'}
+
+class OrderRecord:
+    ''' Holds the latest known state of one order '''
+    __slots__ = ('order_id', 'perm_id', 'parent_id', 'con_id', 'symbol',
+        'action',
+        'order_type', 'quantity', 'lmt_price', 'aux_price', 'status',
+        'filled', 'remaining', 'avg_fill_price', 'executions')
+
+    def __init__(self, order_id):
+        self.order_id = order_id
+        self.perm_id = 0
+        self.parent_id = 0
+        self.con_id = 0
+        self.symbol = ''
+        self.action = ''
+        self.order_type = ''
+        self.quantity = 0.0
+        self.lmt_price = 0.0
+        self.aux_price = 0.0
+        self.status = 'PendingSubmit'
+        self.filled = 0.0
+        self.remaining = 0.0
+        self.avg_fill_price = 0.0
+        self.executions = {}
+
+    def exposure(self):
+        ''' Returns the signed quantity that may still be filled '''
+        if self.status not in ACTIVE_STATUSES:
+            return 0.0
+        return -self.remaining if self.action == 'SELL' else self.remaining
+
+    def __repr__(self):
+        return 'OrderRecord({} {} {} {} {}, {}/{} filled)'.format(
+            self.order_id, self.action, self.quantity, self.symbol,
+            self.status, self.filled, self.quantity)
+
+class OrderStore:
+    ''' Indexes order records by ID, permId, parent, contract and status '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.records = {}
+
+        # Secondary indexes
+        self.perm_ids = {}
+        self.parents = {}
+        self.contracts = {}
+        self.statuses = {}
+
+        # Signed quantity of active orders, keyed by contract ID
+        self.open_qty = {}
+
+    # Updates
+
+    def on_place(self, order_id, contract, order):
+        ''' Records an order as it is passed to placeOrder '''
+        with self.lock:
+            rec = self._checkout(order_id)
+            self._apply_order(rec, contract, order)
+            self._checkin(rec)
+
+    def on_open_order(self, order_id, contract, order, state):
+        ''' Applies the fields of an openOrder callback '''
+        with self.lock:
+            rec = self._checkout(order_id)
+            self._apply_order(rec, contract, order)
+            rec.perm_id = order.permId or rec.perm_id
+            rec.status = state.status or rec.status
+            self._checkin(rec)
+
+    def on_order_status(self, order_id, status, filled, remaining,
+        avg_fill_price, perm_id, parent_id):
+        ''' Applies the fields of an orderStatus callback '''
+        with self.lock:
+            rec = self._checkout(order_id)
+            rec.status = status
+
+            # A stale status can count fewer shares than the executions
+            executed = sum(shares for _, shares, _ in rec.executions.values())
+            if filled >= executed:
+                rec.filled = filled
+                rec.remaining = remaining
+            else:
+                rec.filled = executed
+                rec.remaining = max(rec.quantity - executed, 0.0)
+            rec.avg_fill_price = avg_fill_price
+            rec.perm_id = perm_id or rec.perm_id
+            rec.parent_id = parent_id or rec.parent_id
+            self._checkin(rec)
+
+    def on_execution(self, contract, execution):
+        ''' Applies an execDetails callback, ignoring repeated reports '''
+        with self.lock:
+            rec = self._checkout(execution.orderId)
+            rec.con_id = contract.conId or rec.con_id
+            rec.symbol = rec.symbol or contract.symbol
+            rec.perm_id = execution.permId or rec.perm_id
+
+            # A correction repeats the execId up to its last '.' with a
+            # higher suffix, and replaces the report it corrects
+            exec_id, _, version = execution.execId.rpartition('.')
+            if not exec_id:
+                exec_id, version = version, ''
+            old = rec.executions.get(exec_id)
+            if old is None or version >= old[0]:
+                rec.executions[exec_id] = (version, execution.shares,
+                    execution.price)
+
+            # Count fills that arrive before their orderStatus
+            filled = sum(shares for _, shares, _ in rec.executions.values())
+            if filled > rec.filled:
+                rec.filled = filled
+                rec.remaining = max(rec.quantity - filled, 0.0)
+            self._checkin(rec)
+
+    # Queries
+
+    def get(self, order_id):
+        ''' Returns the record of an order or None '''
+        with self.lock:
+            return self.records.get(order_id)
+
+    def by_perm_id(self, perm_id):
+        ''' Returns the record with the given permanent ID or None '''
+        with self.lock:
+            return self.records.get(self.perm_ids.get(perm_id))
+
+    def children(self, parent_id):
+        ''' Returns the records of orders attached to a parent order '''
+        return self._lookup(self.parents, parent_id)
+
+    def for_contract(self, con_id):
+        ''' Returns the records of orders for a contract ID '''
+        return self._lookup(self.contracts, con_id)
+
+    def with_status(self, status):
+        ''' Returns the records of orders with a status '''
+        return self._lookup(self.statuses, status)
+
+    def exposure(self, con_id):
+        ''' Returns the signed quantity of active orders for a contract ID '''
+        with self.lock:
+            return self.open_qty.get(con_id, 0.0)
+
+    # Index maintenance, called with the lock held
+
+    def _lookup(self, index, key):
+        with self.lock:
+            return [self.records[order_id]
+                for order_id in index.get(key, ())]
+
+    def _checkout(self, order_id):
+        ''' Returns a record after removing it from the indexes '''
+        rec = self.records.get(order_id)
+        if rec is None:
+            rec = self.records[order_id] = OrderRecord(order_id)
+            return rec
+        self.perm_ids.pop(rec.perm_id, None)
+        self.parents.get(rec.parent_id, set()).discard(order_id)
+        self.contracts.get(rec.con_id, set()).discard(order_id)
+        self.statuses.get(rec.status, set()).discard(order_id)
+        self.open_qty[rec.con_id] = \
+            self.open_qty.get(rec.con_id, 0.0) - rec.exposure()
+        return rec
+
+    def _checkin(self, rec):
+        ''' Adds a modified record back to the indexes '''
+        if rec.perm_id:
+            self.perm_ids[rec.perm_id] = rec.order_id
+        if rec.parent_id:
+            self.parents.setdefault(rec.parent_id, set()).add(rec.order_id)
+        self.contracts.setdefault(rec.con_id, set()).add(rec.order_id)
+        self.statuses.setdefault(rec.status, set()).add(rec.order_id)
+        self.open_qty[rec.con_id] = \
+            self.open_qty.get(rec.con_id, 0.0) + rec.exposure()
+
+    @staticmethod
+    def _apply_order(rec, contract, order):
+        rec.con_id = contract.conId or rec.con_id
+        rec.symbol = contract.symbol
+        rec.action = order.action
+        rec.order_type = order.orderType
+        rec.quantity = float(order.totalQuantity)
+        rec.lmt_price = order.lmtPrice
+        rec.aux_price = order.auxPrice
+        rec.parent_id = order.parentId or rec.parent_id
+        if not rec.filled:
+            rec.remaining = rec.quantity
@@ -0,0 +1,46 @@
+''' Tracks the requests a client is waiting on with futures '''
+from concurrent.futures import Future
+
+# Error codes that report a condition without ending the request
+WARNING_CODES = set(range(2100, 2170)) | {10167}
+
+class RequestTracker:
+    ''' Registers requests and completes their futures from callbacks
+
+    A client lists it before EWrapper among its bases, so its error method
+    ends the request that failed. '''
+
+    def __init__(self):
+
+        # Futures for pending requests keyed by request ID, and for orders
+        # keyed by ('order', order ID), as both IDs can be equal
+        self.pending = {}
+
+    def error(self, req_id, code, msg):
+        ''' Called if an error occurs, warnings leave the request open '''
+        print('Error {}: {}'.format(code, msg))
+        if code not in WARNING_CODES:
+
+            # TWS reports errors of requests and orders by the same ID
+            self.resolve(req_id)
+            self.resolve_order(req_id)
+
+    def expect(self, req_id):
+        ''' Registers a request and returns a future for its result '''
+        future = Future()
+        self.pending[req_id] = future
+        return future
+
+    def resolve(self, req_id, result=None):
+        ''' Completes the future of a pending request '''
+        future = self.pending.pop(req_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def expect_order(self, order_id):
+        ''' Registers an order and returns a future for its result '''
+        return self.expect(('order', order_id))
+
+    def resolve_order(self, order_id, result=None):
+        ''' Completes the future of a pending order '''
+        self.resolve(('order', order_id), result)